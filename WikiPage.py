@@ -1,39 +1,149 @@
 # Written by Tommy Zaft
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString
 import re
+import time
 import wikipedia
-import requests
+from transport import WikiSession
+from link_extractor import FirstLinkExtractor, BLOCK_TAGS
+from link_rules import LinkRules, SoupLink
+from metrics import METRICS
 
 
 class WikiPage:
     base_wiki_url = "https://en.wikipedia.org/"
+    # the maximum number of random pages the API gives in a single request.
+    random_batch_size = 500
+    # a persistent LinkCache of first links, consulted before fetching a page. None - no caching.
+    cache = None
+    # the HTTP transport shared by all the pages: keeps connections alive, retries and limits the request rate.
+    session = WikiSession()
+    # True - fetch only the lead section of a page first, and fetch the whole page only if it has no valid link.
+    lead_section_first = True
+    # True - find the first link with a streaming parser which stops at the first valid link.
+    # False - parse the whole page with BeautifulSoup.
+    streaming_parser = True
+
+    # the rules of a valid first link. LinkRules(count_hits=True) - to count which rules reject the most links.
+    link_rules = LinkRules()
+    brackets_pattern = re.compile("[()]")
 
     def __init__(self, page_url, debug=False):
         self.url = None
         self.set_url(page_url)
         self.name = WikiPage.__url_to_name(page_url)
-        # the name shown on the graph.
-        # we replace the ':' with a '˸' because a colon is used as a separator in Graphviz.
-        self.name_to_show = self.name.replace(":\t", ": ").replace(":", "˸")
+        # the name shown of a page which turned out to be a redirect (see keep_name_to_show()).
+        self.redirect_name_to_show = None
         self.html = None
+        self.revid = None
+        # block id -> the ids of the links enclosed in brackets in the block. Kept only while parsing a page.
+        self.bracketed_links = {}
         self.next_url = None
         self.debug = debug
 
-    def get_first_link(self):
-        self.html = self.get_page_html()
-        # print(html)
-        soup = BeautifulSoup(self.html, "html.parser")
+    @property
+    def name_to_show(self):
+        """
+        The name shown on the graph. It is computed only when the page is drawn, so most of the pages visited
+        never keep one.
+        """
+        if self.redirect_name_to_show is not None:
+            return self.redirect_name_to_show
+        return WikiPage.name_to_show_of(self.name)
 
-        first_link = None
+    def keep_name_to_show(self):
+        """
+        Keeps the name shown before the page is renamed to the page it redirects to,
+        so the edges from the page start at the node already drawn for it.
+        """
+        if self.redirect_name_to_show is None:
+            self.redirect_name_to_show = WikiPage.name_to_show_of(self.name)
+
+    @staticmethod
+    def name_to_show_of(name):
+        # we replace the ':' with a '˸' because a colon is used as a separator in Graphviz.
+        return name.replace(":\t", ": ").replace(":", "˸")
+
+    def get_first_link(self, use_cache=True):
+        """
+        Finds the first valid link of the page, from the cache or by fetching the page.
+
+        :param use_cache: False - fetch the page even if it is cached (the cache is still updated).
+        :return: the href of the first valid link, None if there is no valid link.
+        """
+        # the name may change while fetching the page (if it is a redirect), so we save the name requested.
+        requested_name = self.name
+        if WikiPage.cache is not None and use_cache:
+            cached = WikiPage.cache.get(requested_name)
+            if cached is not None:
+                METRICS.count("cache_hits")
+                if cached.name != self.name:
+                    self.keep_name_to_show()
+                    self.name = cached.name
+                    self.set_url(WikiPage.__name_to_url(cached.name))
+                self.revid = cached.revid
+                if self.debug:
+                    print("cached:", self.name, "->", cached.first_link)
+                return cached.first_link
+            METRICS.count("cache_misses")
+
+        if WikiPage.lead_section_first:
+            # the first link is almost always in the lead section, so we fetch only it first.
+            # the pages fetched lead section first, and how many of them had no valid link in it (see METRICS).
+            METRICS.count("lead_fetches")
+            self.html = self.get_page_html(section=0)
+            first_link = self.find_first_link(self.html)
+            if first_link is None and self.html is not None:
+                METRICS.count("lead_fallbacks")
+                if self.debug:
+                    print("no link in the lead section of", self.name, "fetching the whole page")
+                self.html = self.get_page_html()
+                first_link = self.find_first_link(self.html)
+        else:
+            self.html = self.get_page_html()
+            first_link = self.find_first_link(self.html)
 
-        for link in soup.find_all('a', href=True):
-            if self.is_href_valid(link):
-                if first_link is None:
-                    first_link = link['href']
-                    break
         if self.debug:
             print("chose:", WikiPage.__url_to_full_url(first_link))
+        if WikiPage.cache is not None:
+            WikiPage.cache.put(requested_name, first_link, self.name, self.revid)
+        return first_link
+
+    def find_first_link(self, html):
+        """
+        Finds the first valid link in the html of a page.
+
+        :param html: the html of the page.
+        :return: the href of the first valid link, None if there is no valid link.
+        """
+        if html is None:
+            return None
+        with METRICS.stage("parse"):
+            if WikiPage.streaming_parser:
+                return FirstLinkExtractor(WikiPage.link_rules).find_first_link(html)
+            return self.find_first_link_with_soup(html)
+
+    def find_first_link_with_soup(self, html):
+        """
+        Finds the first valid link in the html of a page, by parsing the whole page with BeautifulSoup.
+
+        :param html: the html of the page.
+        :return: the href of the first valid link, None if there is no valid link.
+        """
+        soup = BeautifulSoup(html, "html.parser")
+        self.bracketed_links = {}
+        # the time spent checking the links against the rules.
+        validate_seconds = 0
+
+        first_link = None
+        for link in soup.find_all('a', href=True):
+            validate_start = time.perf_counter()
+            is_valid = self.is_href_valid(link)
+            validate_seconds += time.perf_counter() - validate_start
+            if is_valid:
+                first_link = link['href']
+                break
+        METRICS.observe("stage_seconds", validate_seconds, "validate")
         return first_link
 
     @staticmethod
@@ -46,104 +156,121 @@ class WikiPage:
         :type debug: bool
         :return: a random (WikiPage) wikipedia page.
         """
-        url = requests.get("https://en.wikipedia.org/wiki/Special:Random")
+        url = WikiPage.session.get(WikiPage.base_wiki_url + "wiki/Special:Random")
         random_page_url = WikiPage.__full_url_to_url(url.url)
         return WikiPage(random_page_url, debug)
 
     @staticmethod
-    def is_substring_enclosed_in_brackets(sub, string):
+    def get_random_pages(num_of_pages, debug=False):
         """
-        to check if substring is enclosed in brackets.
+        Get many different random wikipedia pages, using a few API requests instead of one request per page.
 
-        :param sub: the substring
-        :param string: the string
-        :return: True - if substring is enclosed in brackets.
-        False - otherwise.
+        :param num_of_pages: the number of random pages to get.
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        :return: a list of random (WikiPage) wikipedia pages.
+        """
+        url = WikiPage.base_wiki_url + "w/api.php"
+        # only articles (namespace 0), and no redirects - like Special:Random.
+        params = {"action": "query", "list": "random", "rnnamespace": 0, "rnfilterredir": "nonredirects",
+                  "format": "json"}
+        names = []
+        names_seen = set()
+        while len(names) < num_of_pages:
+            params["rnlimit"] = min(WikiPage.random_batch_size, num_of_pages - len(names))
+            response = WikiPage.session.get(url, params).json()
+            num_of_names = len(names)
+            for random_page in response["query"]["random"]:
+                if random_page["title"] not in names_seen:
+                    names_seen.add(random_page["title"])
+                    names.append(random_page["title"])
+            if debug:
+                print("got", len(names), "random pages out of", num_of_pages)
+            # if we didn't get any new page, there are no more pages to get.
+            if len(names) == num_of_pages or len(names) == num_of_names:
+                break
+            params.update(response.get("continue", {}))
+
+        return [WikiPage(WikiPage.__name_to_url(name), debug) for name in names]
+
+    @staticmethod
+    def links_in_brackets(tag):
+        """
+        Finds all the links enclosed in brackets inside a tag, in a single pass over its text.
+        Brackets can be nested to any depth, and brackets inside tags, attributes, comments, scripts or styles
+        are ignored.
+        Like in the FirstLinkExtractor, brackets opened in one block of text (see BLOCK_TAGS) don't enclose links
+        in another one.
+
+        :param tag: the BeautifulSoup tag.
+        :type tag bs4.element.Tag
+        :return: the set of ids (id()) of the links enclosed in brackets.
         """
-        # to get (...)
-        pattern = re.compile("\([^\)]*\)")
-        # to get:  (...(...)...)
-        pattern2 = re.compile("\([^\)]*\([^\)]*\)[^\)]*\)")
-        # to get:  (...(...(...)...)...)
-        pattern3 = re.compile("\([^\)]*\([^\)]*\([^\)]*\)[^\)]*\)[^\)]*\)")
+        links = set()
+        WikiPage.scan_brackets(tag, 0, links)
+        return links
 
-        string = str(string)
-        search = re.findall(pattern, string)
-        search2 = re.findall(pattern2, string)
-        search3 = re.findall(pattern3, string)
+    @staticmethod
+    def scan_brackets(tag, depth, links):
+        """
+        Adds the links enclosed in brackets inside a tag to links.
+
+        :param tag: the BeautifulSoup tag.
+        :param depth: the number of brackets open before the tag.
+        :param links: the set of ids (id()) of the links enclosed in brackets found so far.
+        :return: the number of brackets open after the tag.
+        """
+        for element in tag.children:
+            if isinstance(element, NavigableString):
+                # comments, scripts and styles are strings as well, but they are not a part of the text.
+                if type(element) is not NavigableString:
+                    continue
+                for bracket in WikiPage.brackets_pattern.findall(element):
+                    if bracket == "(":
+                        depth += 1
+                    elif depth > 0:
+                        depth -= 1
+            elif element.name in BLOCK_TAGS:
+                # a block of text starts with no brackets open, and the brackets left open in it end with it.
+                WikiPage.scan_brackets(element, 0, links)
+            else:
+                if element.name == "a" and depth > 0:
+                    links.add(id(element))
+                depth = WikiPage.scan_brackets(element, depth, links)
+        return depth
+
+    def is_enclosed_in_brackets(self, link):
+        """
+        to check if a link is enclosed in brackets in the text around it.
 
-        search3 = set(search + search2 + search3)
-        if any(str(sub) in s for s in search3):  # or any(str(sub) in s for s in search2):
-            return True
-        return False
+        :param link: the BeautifulSoup link.
+        :type link bs4.element.Tag
+        :return: True - if the link is enclosed in brackets.
+        False - otherwise.
+        """
+        # the block of text the link is in, or the whole page if it isn't in any.
+        block = None
+        for block in link.parents:
+            if block.name in BLOCK_TAGS:
+                break
+        if block is None:
+            return False
+        # the links enclosed in brackets are found once for each block, and not once for each link in it.
+        if id(block) not in self.bracketed_links:
+            self.bracketed_links[id(block)] = WikiPage.links_in_brackets(block)
+        return id(link) in self.bracketed_links[id(block)]
 
     def is_href_valid(self, link):
         """
         Checks if the href is a valid Wikipedia link to click on as the first link in an article.
+        The rules checked are the ones in WikiPage.link_rules.
 
         :param link: the BeautifulSoup link.
         :type link bs4.element.Tag
         :return:  True - if the link is ok to click on as a first link in an article
         False - not a valid link to click on.
         """
-        url = str(link['href'])
-        # if it doesn't lead to a wiki page
-        if not url.startswith("/wiki/"):
-            return False
-
-        wikipedia_classes = ["external_text", "mw-disambig", "infobox-data"]
-        # if the href has a class
-        if link.get("class") is not None:
-            link_class = "_".join(link.get("class"))
-            # if the class is an external text class, or a disambiguation link
-            if any(wiki_class in link_class for wiki_class in wikipedia_classes):
-                return False
-
-        if 'wikimedia' in url or 'wiktionary' in url:
-            return False
-        wikipedia_keywords = ["Help", "Category", "Wikipedia", "Template", "File", "Talk", "Special", "Portal"]
-        if any(keyword + ':' in url for keyword in wikipedia_keywords):
-            return False
-        if '#' in url:
-            return False
-        # if the page is a file
-        if re.search("\.[a-zA-Z][a-zA-Z][a-zA-Z]$", url) or re.search("\.[a-zA-Z][a-zA-Z][a-zA-Z][a-zA-Z]$", url):
-            return False
-
-        # if the href is enclosed in brackets
-        if WikiPage.is_substring_enclosed_in_brackets(link, link.parent.parent):
-            return False
-
-        wikipedia_not_needed_tags = ['small', 'sup', 'i']
-        if link.parent.name in wikipedia_not_needed_tags:
-            return False
-
-        # if the href shows two different spellings. like in: https://en.wikipedia.org/wiki/Carbon_fibers
-        # Carbon fibers ~or~ carbon fibres - here or is the href.
-
-        if link.contents == ["or"]:
-            return False
-
-        parents_classes = [p.get("class") for p in link.parents if p.get("class") is not None]
-        parents_classes = [str("_".join(p)) for p in parents_classes]
-        parents_ids = [p.get("id") for p in link.parents if p.get("id") is not None]
-
-        # 'toc' - the Contents menu class
-        # 'mw-editsection' - the Edit section
-        # 'thumbcaption' - a Photo Caption
-        # 'hlist' - a list like in: https://en.wikipedia.org/wiki/January
-        wikipedia_classes_to_ignore = ["thumbcaption", "infobox", "navigation-not-searchable", "sidebar", "box-text",
-                                       "toc", "mw-editsection", "thumb", "hlist", "navbox"]
-
-        for p_class in parents_classes:
-
-            if any(class_to_ignore in p_class for class_to_ignore in wikipedia_classes_to_ignore):
-                return False
-
-        # if it is a coordinates href
-        if "coordinates" in parents_ids:
-            return False
-
         '''
         Update 13.04.2021:
         ------------------
@@ -164,7 +291,7 @@ class WikiPage:
         #   return False
         '''
 
-        return True
+        return WikiPage.link_rules.is_valid(SoupLink(link, self.is_enclosed_in_brackets))
 
     # if we want to init a first page in the chain
     @staticmethod
@@ -201,14 +328,32 @@ class WikiPage:
             name = input("\nPlease enter wiki page name: ")
             search = wikipedia.search(name)
 
+    @staticmethod
+    def from_name(name, debug=False):
+        """
+        :param name: the name of the page.
+        :return: the WikiPage of the page, without checking it.
+        """
+        return WikiPage(WikiPage.__name_to_url(name), debug)
+
     @staticmethod
     def first_page_init(name, debug=False):
-        page_url = WikiPage.__name_to_url(name)
-        # if the page is not a valid wiki page (can be a disambiguation page for example)
-        if not WikiPage.__is_page_ok(name):
-            return None
-        else:
-            return WikiPage(page_url, debug)
+        return WikiPage.first_pages_init([name], debug)[name]
+
+    @staticmethod
+    def first_pages_init(names, debug=False):
+        """
+        Inits the first pages of chains, after checking they are valid wiki pages.
+
+        :param names: the names of the pages.
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        :return: a dict of name -> WikiPage page. None - if the page is not a valid wiki page.
+        """
+        valid_names = WikiPage.validate_names(names)
+        return {name: None if valid_names[name] is None else WikiPage(WikiPage.__name_to_url(valid_names[name]), debug)
+                for name in names}
 
     @staticmethod
     def __name_to_url(name):
@@ -232,31 +377,86 @@ class WikiPage:
         url = WikiPage.base_wiki_url[:-1] + url
         return url
 
-    # checks if the page is not a valid wiki page:
-    # - if it's not a disambiguation page, or it doesn't exist
+    # the maximum number of titles the API accepts in a single query.
+    validation_batch_size = 50
+
+    # checks which pages are valid wiki pages:
+    # - pages that exist, and are not a disambiguation page.
+    # redirects are followed, so the page found is the one the name redirects to.
     @staticmethod
-    def __is_page_ok(name):
-        url = WikiPage.base_wiki_url + "w/api.php?action=parse&page=TITLE_HERE&prop=text&format=json"
-        GET_request = requests.get(url.replace("TITLE_HERE", name))
-        bad_messages_to_see = ["The page you specified doesn't exist", "Disambiguation page", " may refer to:"]
-        if any(bad_msg in GET_request.text for bad_msg in bad_messages_to_see):
-            return False
-        return True
+    def validate_names(names):
+        """
+        Checks many page names at once, using the page props instead of downloading the pages.
 
-    def fix_redirect(self, GET_request):
-        html = GET_request.json()["parse"]["text"]["*"]
-        soup = BeautifulSoup(html, "html.parser")
-        div = soup.find('div', attrs={"class": "redirectMsg"})
-        ul_with_url = None
-        for p_element in div.find_all('p'):
-            if p_element.text == "Redirect to:":
-                ul_with_url = p_element.next_sibling
-        li = ul_with_url.contents[0]
-        url = WikiPage.clean_url(li.contents[0]["href"])
+        :param names: the names of the pages.
+        :return: a dict of name -> the title of the page after following redirects.
+            None - if the page doesn't exist or is a disambiguation page.
+        """
+        url = WikiPage.base_wiki_url + "w/api.php"
+        valid_names = {}
+        names = list(dict.fromkeys(names))
+        for i in range(0, len(names), WikiPage.validation_batch_size):
+            batch = names[i:i + WikiPage.validation_batch_size]
+            params = {"action": "query", "titles": "|".join(batch), "redirects": 1, "prop": "pageprops",
+                      "ppprop": "disambiguation", "format": "json", "formatversion": 2}
+            # the request is timed as a fetch.
+            query = WikiPage.session.get(url, params).json().get("query", {})
+
+            # the title each name ends up at: first normalized (e.g 'formula one' -> 'Formula one'), then redirected.
+            renames = {r["from"]: r["to"] for r in query.get("normalized", []) + query.get("redirects", [])}
+            ok_titles = {p["title"] for p in query.get("pages", [])
+                         if not p.get("missing") and not p.get("invalid")
+                         and "disambiguation" not in p.get("pageprops", {})}
+            for name in batch:
+                title = name
+                # a name can be normalized and then redirected, so we follow the renames until the end.
+                for _ in range(len(renames) + 1):
+                    if title not in renames:
+                        break
+                    title = renames[title]
+                valid_names[name] = title if title in ok_titles else None
+        return valid_names
+
+    @staticmethod
+    def latest_revisions(names):
+        """
+        Gets the latest revision of many pages at once, without downloading the pages.
 
+        :param names: the names of the pages.
+        :return: a dict of name -> the id of the latest revision of the page. None - if the page doesn't exist.
+        """
+        url = WikiPage.base_wiki_url + "w/api.php"
+        revisions = {}
+        names = list(dict.fromkeys(names))
+        for i in range(0, len(names), WikiPage.validation_batch_size):
+            batch = names[i:i + WikiPage.validation_batch_size]
+            params = {"action": "query", "titles": "|".join(batch), "prop": "revisions", "rvprop": "ids",
+                      "format": "json", "formatversion": 2}
+            query = WikiPage.session.get(url, params).json().get("query", {})
+
+            renames = {r["from"]: r["to"] for r in query.get("normalized", [])}
+            latest = {p["title"]: p["revisions"][0]["revid"] for p in query.get("pages", []) if p.get("revisions")}
+            for name in batch:
+                revisions[name] = latest.get(renames.get(name, name))
+        return revisions
+
+    def fix_redirect(self, GET_request, section=None):
+        METRICS.count("redirects")
+        with METRICS.stage("redirect"):
+            html = GET_request.json()["parse"]["text"]["*"]
+            soup = BeautifulSoup(html, "html.parser")
+            div = soup.find('div', attrs={"class": "redirectMsg"})
+            ul_with_url = None
+            for p_element in div.find_all('p'):
+                if p_element.text == "Redirect to:":
+                    ul_with_url = p_element.next_sibling
+            li = ul_with_url.contents[0]
+            url = WikiPage.clean_url(li.contents[0]["href"])
+
+        self.keep_name_to_show()
         self.name = WikiPage.__url_to_name(url)
         self.set_url(url)
-        return self.get_page_html()
+        return self.get_page_html(section)
 
     def set_url(self, url_without_base):
         self.url = WikiPage.base_wiki_url[:-1] + WikiPage.clean_url(url_without_base)
@@ -265,18 +465,28 @@ class WikiPage:
     def clean_url(url):
         return re.sub(r'#.*', '', url)
 
-    def get_page_html(self):
+    def get_page_html(self, section=None):
+        """
+        Gets the parsed html of the page, following redirects.
+
+        :param section: the number of the section to get (0 - the lead section). None - get the whole page.
+        :return: the html of the page, None if the page doesn't exist.
+        """
         url = WikiPage.base_wiki_url + "w/api.php?action=parse&page=TITLE_HERE&prop=text&format=json"
         url = url.replace("TITLE_HERE", self.name)
+        if section is not None:
+            url += "&section=" + str(section)
         if self.debug:
             print(url)
-        GET_request = requests.get(url)
+        GET_request = WikiPage.session.get(url)
         # if the page is a redirect page
         if "Redirect to:" in GET_request.text:
-            return self.fix_redirect(GET_request)
+            return self.fix_redirect(GET_request, section)
 
         if "missingtitle" in GET_request.text:
             print("didn't find", self.name)
             return None
 
-        return GET_request.json()["parse"]["text"]["*"]
+        parse = GET_request.json()["parse"]
+        self.revid = parse.get("revid")
+        return parse["text"]["*"]
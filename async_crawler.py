@@ -0,0 +1,122 @@
+from chain_memo import ChainMemo, PHILOSOPHY
+from metrics import METRICS
+# to advance many chains at the same time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# the default number of pages fetched at the same time.
+DEFAULT_CONCURRENCY = 8
+
+
+class AsyncCrawler:
+    """
+    Advances the chains of many pages at the same time, and records every page visited in a ChainMemo.
+
+    The crawler only fills the memo. Drawing the pages afterwards with draw_page_path() and the same memo
+    doesn't fetch anything, so the graph drawn is the same as the one drawn one page at a time.
+    """
+
+    def __init__(self, memo, concurrency=DEFAULT_CONCURRENCY, debug=False, journal=None):
+        """
+        :param memo: the ChainMemo to fill.
+        :type memo: ChainMemo
+        :param concurrency: the maximum number of pages fetched at the same time.
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        :param journal: the RunJournal every chain walked is written to. None - no journal.
+        :type journal: RunJournal
+        """
+        self.memo = memo
+        self.concurrency = concurrency
+        self.debug = debug
+        self.journal = journal
+        self.executor = None
+        # page name -> the future of the next page, for the pages being fetched right now.
+        self.in_flight = {}
+        # the pages some chain is already walking through. A chain reaching one of them can stop there.
+        self.claimed = set()
+
+    def crawl(self, pages):
+        """
+        Walks the chains of all the pages, until each of them reaches "Philosophy", a loop, a dead end,
+        or a page another chain already walks through.
+
+        :param pages: the WikiPage pages to start from.
+        :return: None
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            self.executor = executor
+            asyncio.run(self.__crawl(pages))
+        self.executor = None
+        self.in_flight = {}
+        self.claimed = set()
+
+    async def __crawl(self, pages):
+        await asyncio.gather(*[self.walk(page) for page in pages])
+
+    async def walk(self, page):
+        """
+        Walks the chain of a single page.
+
+        :param page: the WikiPage page to start from.
+        :type page: WikiPage page
+        :return: None
+        """
+        road_of_page = [page.name]
+        pages_on_road = {page.name}
+        self.claimed.add(page.name)
+        count_pages = 0
+        dead_end = False
+        while page.name != PHILOSOPHY and count_pages <= 100:
+            try:
+                next_page = await self.next_page(page)
+            except Exception as e:
+                # drawing the page afterwards will try fetching it again.
+                print("Failed fetching", page.name, ":", e)
+                break
+            count_pages += 1
+            if next_page is None:
+                dead_end = True
+                break
+            road_of_page.append(next_page.name)
+            # if we reached a loop, or a page another chain walks through.
+            if next_page.name in pages_on_road or next_page.name in self.claimed:
+                break
+            pages_on_road.add(next_page.name)
+            self.claimed.add(next_page.name)
+            page = next_page
+        if self.journal is not None:
+            self.journal.chain(road_of_page, dead_end)
+
+    async def next_page(self, page):
+        """
+        Gets the next page in the chain of page.
+        If another chain is fetching the same page right now, we wait for it instead of fetching it again.
+
+        :param page: the WikiPage page.
+        :type page: WikiPage page
+        :return: the next WikiPage in the chain, or None if the page has no valid link.
+        """
+        name = page.name
+        if name in self.memo:
+            METRICS.count("memo_hits")
+            return self.memo.successor_page(name, self.debug)
+        if name in self.in_flight:
+            return await self.in_flight[name]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.in_flight[name] = future
+        try:
+            next_page = await loop.run_in_executor(self.executor, ChainMemo.fetch_next_page, page, self.debug)
+        except Exception as e:
+            future.set_exception(e)
+            # marks the exception as retrieved, in case no other chain is waiting for it.
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[name]
+        self.memo.record_visit(name, page, next_page)
+        future.set_result(next_page)
+        return next_page
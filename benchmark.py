@@ -0,0 +1,369 @@
+import helper
+from WikiPage import WikiPage
+from chain_memo import ChainMemo
+from link_extractor import FirstLinkExtractor
+from offline_dump import open_compressed
+from transport import WikiSession
+# to replay the recorded responses
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import requests
+import threading
+# to run every mode in a fresh process, and measure it
+import multiprocessing
+import resource
+import subprocess
+import json
+import glob
+import os
+import random
+import time
+import sys
+
+# the latency of every response of the stand-in server, and the random jitter added to it (milliseconds).
+LATENCY_MS = 50
+JITTER_MS = 20
+
+# the number of pages fetched at the same time in the concurrent mode.
+CONCURRENCY = 8
+
+# the modes measured: the settings of WikiPage, and the concurrency of draw_list_of_pages().
+MODES = {
+    "sequential_soup": {"streaming_parser": False, "lead_section_first": False, "concurrency": None},
+    "sequential": {"streaming_parser": True, "lead_section_first": True, "concurrency": None},
+    "concurrent": {"streaming_parser": True, "lead_section_first": True, "concurrency": CONCURRENCY},
+}
+
+# the query parameters which don't change the response.
+IGNORED_PARAMETERS = {"maxlag"}
+
+# the lead sections of real pages, used as the pages of a corpus built offline (see build_corpus()).
+LEAD_SECTIONS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "lead_sections")
+# the number of pages in a corpus built offline. page k links to page k // 2, so the chains merge like in a tree.
+NUM_OF_BUILT_PAGES = 63
+
+
+def request_key(url):
+    """
+    :return: the key of a request in the corpus: its path and its sorted query parameters.
+        e.g: "/w/api.php?action=parse&format=json&page=Banana&prop=text&section=0"
+    """
+    url = urlsplit(url)
+    params = sorted((k, v) for k, v in parse_qsl(url.query, keep_blank_values=True) if k not in IGNORED_PARAMETERS)
+    return url.path + "?" + urlencode(params)
+
+
+def record_corpus(names, corpus_file_name, debug=False):
+    """
+    Walks the chains of pages on the live Wikipedia, and records every response got into a corpus file.
+    The chains are walked once with every setting of lead_section_first in MODES, so the corpus has both the lead
+    section and the whole page responses every mode asks for.
+    The first line of the corpus is {"start_pages": [...]}, and every other line is {"key": ..., "body": ...}.
+
+    :param names: the names of the pages to start from.
+    :param corpus_file_name: the corpus file to write (.jsonl, optionally .gz or .bz2).
+    :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+    :type debug: bool
+    :return: the number of responses recorded.
+    """
+    responses = {}
+    get = WikiPage.session.get
+
+    def recording_get(url, params=None):
+        response = get(url, params)
+        responses[request_key(response.url)] = response.text
+        return response
+
+    lead_section_first, cache, memo = WikiPage.lead_section_first, WikiPage.cache, helper.CHAIN_MEMO
+    WikiPage.session.get = recording_get
+    # every page has to be fetched, so nothing is taken from the cache.
+    WikiPage.cache = None
+    try:
+        for mode_lead_section_first in sorted({mode["lead_section_first"] for mode in MODES.values()}):
+            WikiPage.lead_section_first = mode_lead_section_first
+            helper.CHAIN_MEMO = ChainMemo()
+            first_pages = WikiPage.first_pages_init(names, debug)
+            pages = [page for page in first_pages.values() if page is not None]
+            helper.draw_list_of_pages(pages, helper.create_digraph(), debug)
+    finally:
+        WikiPage.session.get = get
+        WikiPage.lead_section_first, WikiPage.cache, helper.CHAIN_MEMO = lead_section_first, cache, memo
+
+    with open_compressed(corpus_file_name, "wt") as corpus:
+        corpus.write(json.dumps({"start_pages": names}) + "\n")
+        for key, body in responses.items():
+            corpus.write(json.dumps({"key": key, "body": body}) + "\n")
+    return len(responses)
+
+
+class BuiltResponse:
+    """
+    A response of the built site, with what record_corpus() and WikiPage use of a requests.Response.
+    """
+
+    def __init__(self, url, body):
+        self.url = url
+        self.text = json.dumps(body)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def built_pages(num_of_pages=NUM_OF_BUILT_PAGES):
+    """
+    Makes the pages of a corpus built offline: "Page 1" ... "Page <num_of_pages>", where page k links to page k // 2
+    and "Page 1" links to "Philosophy". Every page is a saved lead section of a real page, with its first link pointed
+    at the next page, so the parsers work on real html.
+
+    :param num_of_pages: the number of pages to make.
+    :return: a dict of the name of the page -> its html.
+    """
+    lead_sections = []
+    for file_name in sorted(glob.glob(os.path.join(LEAD_SECTIONS_FOLDER, "*.html"))):
+        with open(file_name, encoding="utf-8") as f:
+            html = f.read()
+        first_link = FirstLinkExtractor(WikiPage.link_rules).find_first_link(html)
+        # a lead section without a valid link can't be pointed at the next page.
+        if first_link is not None and 'href="' + first_link + '"' in html:
+            lead_sections.append((html, first_link))
+
+    pages = {}
+    for k in range(1, num_of_pages + 1):
+        html, first_link = lead_sections[k % len(lead_sections)]
+        next_url = "/wiki/Page_" + str(k // 2) if k > 1 else "/wiki/Philosophy"
+        pages["Page " + str(k)] = html.replace('href="' + first_link + '"', 'href="' + next_url + '"')
+    return pages
+
+
+def build_corpus(corpus_file_name, num_of_pages=NUM_OF_BUILT_PAGES, debug=False):
+    """
+    Builds a corpus offline, without the live Wikipedia: the pages of built_pages() are served in place of Wikipedia
+    while record_corpus() walks them, so the corpus has exactly the requests the modes send.
+    The pages no other page links to are the pages to start from.
+
+    :param corpus_file_name: the corpus file to write (.jsonl, optionally .gz or .bz2).
+    :param num_of_pages: the number of pages in the corpus.
+    :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+    :type debug: bool
+    :return: the number of responses recorded.
+    """
+    pages = built_pages(num_of_pages)
+
+    def built_get(url, params=None):
+        url = requests.Request("GET", url, params=params).prepare().url
+        query = dict(parse_qsl(urlsplit(url).query))
+        if query.get("action") == "query":
+            titles = query["titles"].split("|")
+            return BuiltResponse(url, {"query": {"pages": [{"ns": 0, "title": title} if title in pages else
+                                                           {"ns": 0, "title": title, "missing": True}
+                                                           for title in titles]}})
+        name = query.get("page", "").replace("_", " ")
+        if name not in pages:
+            return BuiltResponse(url, {"error": {"code": "missingtitle", "info": "not in the built corpus"}})
+        return BuiltResponse(url, {"parse": {"title": name, "revid": 1, "text": {"*": pages[name]}}})
+
+    WikiPage.session.get = built_get
+    try:
+        return record_corpus(["Page " + str(k) for k in range(num_of_pages // 2 + 1, num_of_pages + 1)],
+                             corpus_file_name, debug)
+    finally:
+        # the instance attribute hid the get of the class.
+        del WikiPage.session.get
+
+
+def load_corpus(corpus_file_name):
+    """
+    :return: (the names of the pages to start from, a dict of request key -> the response body).
+    """
+    responses = {}
+    with open_compressed(corpus_file_name, "rt") as corpus:
+        start_pages = json.loads(corpus.readline())["start_pages"]
+        for line in corpus:
+            entry = json.loads(line)
+            responses[entry["key"]] = entry["body"]
+    return start_pages, responses
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    A local stand-in for Wikipedia, answering with the responses recorded in a corpus after a configurable latency.
+    A request which was not recorded is answered like a page which doesn't exist.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, responses, latency_ms=LATENCY_MS, jitter_ms=JITTER_MS):
+        """
+        :param responses: a dict of request key -> the response body.
+        :param latency_ms: the latency of every response (milliseconds).
+        :param jitter_ms: the maximum random time added to the latency (milliseconds).
+        """
+        super().__init__(("127.0.0.1", 0), ReplayHandler)
+        self.responses = responses
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.num_of_requests = 0
+        self.num_of_misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:" + str(self.server_address[1]) + "/"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        time.sleep((server.latency_ms + random.uniform(0, server.jitter_ms)) / 1000)
+        body = server.responses.get(request_key(self.path))
+        with server.lock:
+            server.num_of_requests += 1
+            if body is None:
+                server.num_of_misses += 1
+        if body is None:
+            body = json.dumps({"error": {"code": "missingtitle", "info": "not in the corpus"}})
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # we don't print every request
+        pass
+
+
+def run_mode(base_url, start_pages, mode):
+    """
+    Draws the start pages once, in a single mode. Runs in a freshly spawned worker process (not forked, so the corpus
+    loaded by the parent isn't in its memory), so the peak memory is its own.
+
+    :param base_url: the url of the stand-in server.
+    :param start_pages: the names of the pages to start from.
+    :param mode: the settings of the mode, like in MODES.
+    :return: a dict of the measurements.
+    """
+    WikiPage.base_wiki_url = base_url
+    # the stand-in server doesn't need to be protected from us.
+    WikiPage.session = WikiSession(requests_per_second=None)
+    WikiPage.cache = None
+    WikiPage.streaming_parser = mode["streaming_parser"]
+    WikiPage.lead_section_first = mode["lead_section_first"]
+    helper.CHAIN_MEMO = ChainMemo()
+
+    counts = {"requests": 0, "parses": 0, "parse_seconds": 0, "pages_fetched": 0}
+    get = WikiPage.session.get
+    find_first_link = WikiPage.find_first_link
+    get_first_link = WikiPage.get_first_link
+
+    def counting_get(url, params=None):
+        counts["requests"] += 1
+        return get(url, params)
+
+    def timed_find_first_link(self, html):
+        start = time.perf_counter()
+        try:
+            return find_first_link(self, html)
+        finally:
+            counts["parses"] += 1
+            counts["parse_seconds"] += time.perf_counter() - start
+
+    def counting_get_first_link(self, use_cache=True):
+        counts["pages_fetched"] += 1
+        return get_first_link(self, use_cache)
+
+    WikiPage.session.get = counting_get
+    WikiPage.find_first_link = timed_find_first_link
+    WikiPage.get_first_link = counting_get_first_link
+
+    start_time = time.perf_counter()
+    pages = [page for page in WikiPage.first_pages_init(start_pages).values() if page is not None]
+    _, num_drawn = helper.draw_list_of_pages(pages, helper.create_digraph(), concurrency=mode["concurrency"])
+    seconds = time.perf_counter() - start_time
+
+    return {
+        "seconds": round(seconds, 3),
+        "pages_fetched": counts["pages_fetched"],
+        "pages_drawn": num_drawn,
+        "pages_per_second": round(counts["pages_fetched"] / seconds, 2) if seconds else None,
+        "parse_ms_per_page": round(1000 * counts["parse_seconds"] / max(1, counts["parses"]), 3),
+        "requests": counts["requests"],
+        "requests_per_chain": round(counts["requests"] / max(1, len(pages)), 2),
+        # on Linux ru_maxrss is in kilobytes.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def current_commit():
+    """
+    :return: the commit the benchmark runs on, None if it is not run in a git repository.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(corpus_file_name, latency_ms=LATENCY_MS, jitter_ms=JITTER_MS, modes=None):
+    """
+    Replays a corpus through the stand-in server, and measures every mode on it.
+
+    :param corpus_file_name: the corpus file, written by record_corpus().
+    :param latency_ms: the latency of every response (milliseconds).
+    :param jitter_ms: the maximum random time added to the latency (milliseconds).
+    :param modes: the names of the modes to measure. None - all the MODES.
+    :return: a dict of the results, ready to be saved as json.
+    """
+    start_pages, responses = load_corpus(corpus_file_name)
+    results = {"commit": current_commit(), "corpus": corpus_file_name, "start_pages": len(start_pages),
+               "latency_ms": latency_ms, "jitter_ms": jitter_ms, "modes": {}}
+    with ReplayServer(responses, latency_ms, jitter_ms) as server:
+        for name in modes or MODES:
+            num_of_misses = server.num_of_misses
+            # a new process for every mode, so nothing is shared between the modes.
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                results["modes"][name] = pool.apply(run_mode, (server.base_url, start_pages, MODES[name]))
+            results["modes"][name]["requests_not_in_corpus"] = server.num_of_misses - num_of_misses
+            print(name, results["modes"][name], file=sys.stderr)
+            if results["modes"][name]["requests_not_in_corpus"] > 0:
+                # the chains stop at the pages missing, so the measurements of the mode are not comparable.
+                print("WARNING:", results["modes"][name]["requests_not_in_corpus"], "requests of", name,
+                      "are not in the corpus. Record it again.", file=sys.stderr)
+        results["requests_not_in_corpus"] = server.num_of_misses
+    return results
+
+
+if __name__ == '__main__':
+    # to record a corpus (on the live Wikipedia):
+    #     python benchmark.py record corpus.jsonl.gz Banana Mathematics "Formula One"
+    # or to build one offline, from the saved lead sections of real pages:
+    #     python benchmark.py build corpus.jsonl.gz [number of pages]
+    # to run the benchmark on it (offline), optionally saving the results:
+    #     python benchmark.py run corpus.jsonl.gz [results.json] [latency ms] [jitter ms]
+    if sys.argv[1] == "record":
+        print("recorded", record_corpus(sys.argv[3:], sys.argv[2]), "responses")
+    elif sys.argv[1] == "build":
+        print("built", build_corpus(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else NUM_OF_BUILT_PAGES),
+              "responses")
+    else:
+        benchmark_results = run_benchmark(sys.argv[2],
+                                          int(sys.argv[4]) if len(sys.argv) > 4 else LATENCY_MS,
+                                          int(sys.argv[5]) if len(sys.argv) > 5 else JITTER_MS)
+        output = json.dumps(benchmark_results, indent=2)
+        print(output)
+        if len(sys.argv) > 3:
+            with open(sys.argv[3], "w") as f:
+                f.write(output + "\n")
@@ -0,0 +1,194 @@
+from WikiPage import WikiPage
+from graph_store import GraphStore, NOT_VISITED, NO_LINK
+from metrics import METRICS
+from graph_analysis import NO_SUCCESSOR, reverse_edges, predecessors_of
+# to find the chains passing through pages
+import numpy as np
+
+# the page all the chains should get to.
+PHILOSOPHY = "Philosophy"
+# the end of a chain stopped by a page with no valid link (or a page that doesn't exist).
+DEAD_END = None
+
+
+class ChainMemo:
+    """
+    Remembers, for every page ever visited, the page its first link leads to.
+    A chain reaching a page we already visited continues from the memo, without fetching the page again.
+
+    It also resolves where each chain ends: the distance of a page from "Philosophy",
+    or the loop it falls into.
+
+    The first links are kept in a GraphStore (titles interned to ids), so no WikiPage is kept alive.
+    """
+
+    def __init__(self, store=None):
+        """
+        :param store: the GraphStore of the first links. None - a new empty store.
+        :type store: GraphStore
+        """
+        self.store = GraphStore() if store is None else store
+        # page id -> (distance, end). end is PHILOSOPHY, DEAD_END or a tuple of the page names in the loop.
+        self.resolved = {}
+
+    def __contains__(self, name):
+        return name in self.store
+
+    def __len__(self):
+        return self.store.num_visited
+
+    def next_page(self, page, debug=False):
+        """
+        Gets the next page in the chain of page. The page is fetched only if we never visited it before.
+
+        :param page: the WikiPage page.
+        :type page: WikiPage page
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        :return: the next WikiPage in the chain, or None if the page has no valid link.
+        """
+        name = page.name
+        if name in self.store:
+            METRICS.count("memo_hits")
+            return self.successor_page(name, debug)
+
+        next_page = ChainMemo.fetch_next_page(page, debug)
+        self.record_visit(name, page, next_page)
+        return next_page
+
+    def successor_page(self, name, debug=False):
+        """
+        :param name: the name of a page visited.
+        :return: a new WikiPage of the next page in the chain of the page, or None if the page has no valid link.
+        """
+        next_name = self.store.successor(name)
+        return None if next_name is None else WikiPage.from_name(next_name, debug)
+
+    @staticmethod
+    def fetch_next_page(page, debug=False):
+        """
+        Fetches the page and creates the next page in its chain, without looking at the memo.
+
+        :param page: the WikiPage page.
+        :type page: WikiPage page
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        :return: the next WikiPage in the chain, or None if the page has no valid link.
+        """
+        next_url = page.get_first_link()
+        # we don't need the html of the page anymore.
+        page.html = None
+        return None if next_url is None else WikiPage(next_url, debug)
+
+    def record_visit(self, name, page, next_page):
+        """
+        Records a page we just fetched.
+
+        :param name: the name of the page before fetching it.
+        :param page: the WikiPage page fetched.
+        :param next_page: the next WikiPage in the chain, None if the page has no valid link.
+        :return: None
+        """
+        self.record(name, next_page)
+        # if the page was a redirect, page.name is now the name of the page it redirects to.
+        if page.name != name:
+            self.record(page.name, next_page)
+
+    def record(self, name, next_page):
+        """
+        Records the next page in the chain of a page.
+
+        :param name: the name of the page.
+        :param next_page: the next WikiPage in the chain, None if the page has no valid link.
+        :return: None
+        """
+        self.set_successor(name, None if next_page is None else next_page.name)
+
+    def set_successor(self, name, next_name):
+        """
+        Records the first link of a page. All the first links are recorded through it (and not straight in the store):
+        if the first link of a page visited before changed, where the chains passing through it end is forgotten.
+
+        :param name: the name of the page.
+        :param next_name: the name of the page its first link leads to, None if it has no valid link.
+        :return: None
+        """
+        if self.resolved and name in self.store and self.store.successor(name) != next_name:
+            self.invalidate([name])
+        self.store.set_successor(name, next_name)
+
+    def resolve(self, name):
+        """
+        Resolves where the chain of a page ends, using only the pages already visited.
+        Every page passed on the way is resolved as well, so resolving a chain merging into it later stops right there.
+
+        :param name: the name of the page.
+        :return: (distance, end) - the number of pages clicked until reaching the end, and the end:
+            PHILOSOPHY, DEAD_END or a tuple of the page names in the loop the chain falls into.
+            None - if the end of the chain wasn't visited yet.
+        """
+        store = self.store
+        if name not in store.ids:
+            return None
+        start = store.ids[name]
+        philosophy = store.ids.get(PHILOSOPHY)
+        path = []
+        index_in_path = {}
+        current = start
+        while current not in self.resolved:
+            next_id = store.successors[current]
+            if current == philosophy:
+                self.resolved[current] = (0, PHILOSOPHY)
+            elif current in index_in_path:
+                # we got back to a page on the path, so everything from there is a loop.
+                loop_start = index_in_path[current]
+                loop = tuple(store.titles[i] for i in path[loop_start:])
+                for page_id in path[loop_start:]:
+                    self.resolved[page_id] = (0, loop)
+                path = path[:loop_start]
+            elif next_id == NOT_VISITED:
+                return None
+            elif next_id == NO_LINK:
+                self.resolved[current] = (0, DEAD_END)
+            else:
+                index_in_path[current] = len(path)
+                path.append(current)
+                current = int(next_id)
+
+        distance, end = self.resolved[current]
+        for page_id in reversed(path):
+            distance += 1
+            self.resolved[page_id] = (distance, end)
+        return self.resolved[start]
+
+    def invalidate(self, names):
+        """
+        Forgets the first links of pages which changed, and where every chain passing through them ends.
+        The pages are fetched again the next time a chain reaches them.
+
+        :param names: the names of the pages which changed.
+        :return: the number of pages whose chain passes through a page which changed.
+        """
+        store = self.store
+        changed = np.array(sorted({store.ids[name] for name in names if name in store.ids}), dtype=np.int64)
+        if len(changed) == 0:
+            return 0
+        successors = store.successors_array()
+        offsets, predecessors = reverse_edges(np.where(successors < 0, NO_SUCCESSOR, successors))
+
+        # we walk the links backwards from the pages which changed.
+        passing = np.zeros(len(store), dtype=bool)
+        passing[changed] = True
+        frontier = changed
+        while len(frontier) > 0:
+            frontier = predecessors_of(frontier, offsets, predecessors)
+            frontier = frontier[~passing[frontier]]
+            passing[frontier] = True
+
+        for page_id in np.flatnonzero(passing):
+            self.resolved.pop(int(page_id), None)
+        for page_id in changed:
+            store.forget(store.titles[page_id])
+        return int(passing.sum())
@@ -9,6 +9,26 @@ import time
 # True - if you want to debug or get information about the program while it's running.
 DEBUG = False
 
+# True - if you want to save the first links found in a persistent cache, so the next runs don't fetch them again.
+USE_LINK_CACHE = True
+
+# a folder to save the pages visited in at the end of the run, and to load them from (memory-mapped) at the start of the
+# next runs, so the chains passing through them are not walked again. Unlike the cache, they are never refreshed.
+# None - every run starts with no pages visited.
+GRAPH_STORE_FOLDER = None
+
+# the number of pages fetched at the same time (e.g 8). None - fetch the pages one at a time.
+CONCURRENCY = None
+
+# the number of worker processes walking the chains, so parsing the pages uses all the cores (overrides CONCURRENCY).
+# None - walk them in this process.
+PROCESSES = None
+
+# the format of a file to write the nodes and the edges to as soon as they are drawn, instead of keeping the graph in
+# memory, in the ./output folder: "jsonl", "csv" or "graphml", optionally compressed ("jsonl.gz").
+# It is rendered later with edge_sink.py. None - keep the graph in memory, and render it right away.
+EDGES_FILE_FORMAT = None
+
 '''
     The output file formats. I used .pdf and .svg which are both very convenient.
     I prefer .svg because the library supports making nodes clickable.
@@ -30,17 +50,32 @@ def main():
     to draw 5 handpicked pages, we run in terminal:
     python draw_handpicked_pages.py 5
 
+    If the run stopped in the middle, run it again with --resume to continue it with the same pages:
+    python draw_handpicked_pages.py --resume 5
+
     :return: None
     """
-
-    num_of_pages = int(sys.argv[1])
-
-    u = helper.create_digraph()
+    if USE_LINK_CACHE:
+        helper.enable_link_cache()
+    if GRAPH_STORE_FOLDER is not None:
+        helper.load_graph_store(GRAPH_STORE_FOLDER)
+    metrics_reporter = helper.start_metrics_reporter()
+    # --resume - continue the previous run from its journal, instead of starting over.
+    args = [arg for arg in sys.argv[1:] if arg != "--resume"]
+    helper.start_run_journal(resume=len(args) < len(sys.argv) - 1)
+
+    num_of_pages = int(args[0])
+
+    # with a file to save the graph to, the nodes and the edges are only written to it as soon as they are drawn
+    # (so the memory stays flat), and the graph is rendered later with edge_sink.py.
+    sink = None if EDGES_FILE_FORMAT is None else helper.open_edge_sink(EDGES_FILE_FORMAT)
+    u = helper.create_digraph() if sink is None else None
+    drawing = u if sink is None else sink
 
     start_time = time.time()
 
     # if you want to choose each page manually in the drawing
-    first_pages, total_num_drawn = helper.handpick_and_draw(num_of_pages, u, DEBUG)
+    first_pages, total_num_drawn = helper.handpick_and_draw(num_of_pages, drawing, DEBUG, CONCURRENCY, PROCESSES)
 
     # we print details about the run: "run ended after: 0.34 minutes, ran on 2 names"
     time_in_minutes = helper.print_running_report(time.time(), start_time, len(first_pages))
@@ -48,14 +83,23 @@ def main():
     print()
 
     # adds a label with some details about the graph.
-    u.attr(label=helper.create_label_for_output_file(first_pages, time_in_minutes, total_num_drawn),
-           fontsize=helper.LABEL_FONT_SIZE)
-
-    for output_format in output_file_formats:
-        u.format = output_format
-        u.view()
-        # we create a copy of the graph we just generated, save it in ./output folder and give it a useful name.
-        helper.create_corresponding_copy(helper.WORK_FILE_NAME, first_pages, output_format)
+    label = helper.create_label_for_output_file(first_pages, time_in_minutes, total_num_drawn)
+    if sink is not None:
+        sink.attr(label=label, fontsize=helper.LABEL_FONT_SIZE)
+        sink.close()
+        print("Saved the graph to", sink.file_name, "- render it with: python edge_sink.py", sink.file_name)
+    else:
+        # a graph too big to draw page by page is drawn as a summary.
+        u = helper.summarize_large_graph(u, first_pages, total_num_drawn)
+        u.attr(label=label, fontsize=helper.LABEL_FONT_SIZE)
+
+        # we render the graph into the ./output folder, and give it a useful name.
+        helper.render_graph(u, first_pages, output_file_formats)
+
+    if GRAPH_STORE_FOLDER is not None:
+        helper.save_graph_store(GRAPH_STORE_FOLDER)
+    helper.stop_run_journal()
+    metrics_reporter.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+# Written by Tommy Zaft
+
+import helper
+from predecessor_index import PredecessorIndex
+# to get args
+import sys
+# to measure time
+import time
+
+# the directory of the predecessor index, built with: python predecessor_index.py first_links.tsv.gz in_tree_index
+INDEX_DIRECTORY = "in_tree_index"
+
+# the maximum number of clicks from a page drawn to the page chosen. None - no limit.
+MAX_DEPTH = 3
+# draw only the k predecessors with the biggest in-trees of every page. None - draw all of them.
+TOP_K = 10
+
+'''
+    The output file formats. I used .pdf and .svg which are both very convenient.
+    I prefer .svg because the library supports making nodes clickable.
+    Graphviz documentation: https://graphviz.org/doc/info/output.html
+
+    e.g:
+    output_file_formats = ["svg", "jpg"]
+    '''
+output_file_formats = ["svg", "pdf"]
+
+
+def main():
+    """
+    Gets in args the title of a page,
+    and the program draws a graph of all the Wikipedia articles whose "Getting to Philosophy" path passes through it.
+
+    for example:
+    to draw the pages leading to Mathematics, we run in terminal:
+    python draw_in_tree.py Mathematics
+
+    :return: None
+    """
+    title = ' '.join(sys.argv[1:])
+
+    index = PredecessorIndex.load(INDEX_DIRECTORY)
+    if title not in index:
+        print("Didn't find", title)
+        return
+
+    metrics_reporter = helper.start_metrics_reporter()
+
+    print("Drawing the pages leading to", title, "...")
+
+    u = helper.create_digraph()
+
+    start_time = time.time()
+
+    total_num_drawn = helper.draw_in_tree(title, u, index, MAX_DEPTH, TOP_K)
+
+    # we print details about the run: "run ended after: 0.34 minutes, ran on 2 names"
+    time_in_minutes = helper.print_running_report(time.time(), start_time, 1)
+
+    print()
+
+    # adds a label with some details about the graph.
+    u.attr(label=helper.create_label_for_output_file([title], time_in_minutes, total_num_drawn),
+           fontsize=helper.LABEL_FONT_SIZE)
+
+    # we render the graph into the ./output folder, and give it a useful name.
+    helper.render_graph(u, [title], output_file_formats)
+
+    metrics_reporter.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+from offline_dump import open_compressed
+from abc import ABC, abstractmethod
+import csv
+import json
+import os
+import sqlite3
+import sys
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+# a sink writes its file to the disk every so many records, so a run which dies loses almost nothing.
+FLUSH_EVERY = 100
+
+# the node attributes kept in a GraphML file (GraphML needs to know them before the first node is written).
+GRAPHML_NODE_ATTRIBUTES = ("URL", "color", "fontsize", "label", "shape")
+GRAPHML_NAMESPACE = "http://graphml.graphdrawing.org/xmlns"
+
+
+class EdgeSink(ABC):
+    """
+    Writes the nodes and the edges of a graph to a file as soon as they are drawn, instead of keeping them in memory.
+    A sink has the node(), edge() and attr() methods of a Digraph, so it can be drawn on instead of one
+    (and a Tee draws on a Digraph and a sink together).
+
+    The file can be loaded back into a Digraph with load_digraph(), to render it or analyse it without crawling again.
+    """
+
+    def __init__(self, file_name):
+        """
+        :param file_name: the file to write. Compressed if it ends with .gz or .bz2.
+        """
+        self.file_name = file_name
+        self.file = open_compressed(file_name, "wt")
+        self.num_of_records = 0
+
+    def node(self, name, **attrs):
+        self.write_node(name, attrs)
+        self.__written()
+
+    def edge(self, tail_name, head_name, **attrs):
+        self.write_edge(tail_name, head_name, attrs)
+        self.__written()
+
+    def attr(self, **attrs):
+        """
+        Sets attributes of the graph itself, like its label.
+        """
+        self.write_graph_attrs(attrs)
+        self.__written()
+
+    def __written(self):
+        self.num_of_records += 1
+        if self.num_of_records % FLUSH_EVERY == 0:
+            self.file.flush()
+
+    @abstractmethod
+    def write_node(self, name, attrs):
+        pass
+
+    @abstractmethod
+    def write_edge(self, tail_name, head_name, attrs):
+        pass
+
+    @abstractmethod
+    def write_graph_attrs(self, attrs):
+        pass
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class JsonlSink(EdgeSink):
+    """
+    A line of json for every record:
+    {"node": name, "attrs": {...}}, {"edge": [tail, head], "attrs": {...}} or {"graph": {...}}.
+    """
+
+    def write_node(self, name, attrs):
+        self.file.write(json.dumps({"node": name, "attrs": attrs}) + "\n")
+
+    def write_edge(self, tail_name, head_name, attrs):
+        self.file.write(json.dumps({"edge": [tail_name, head_name], "attrs": attrs}) + "\n")
+
+    def write_graph_attrs(self, attrs):
+        self.file.write(json.dumps({"graph": attrs}) + "\n")
+
+
+class CsvSink(EdgeSink):
+    """
+    A row for every record: kind (node, edge or graph), name (the tail of an edge), the head of an edge,
+    and the attributes as json.
+    """
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["kind", "name", "head", "attrs"])
+
+    def write_node(self, name, attrs):
+        self.writer.writerow(["node", name, "", json.dumps(attrs)])
+
+    def write_edge(self, tail_name, head_name, attrs):
+        self.writer.writerow(["edge", tail_name, head_name, json.dumps(attrs)])
+
+    def write_graph_attrs(self, attrs):
+        self.writer.writerow(["graph", "", "", json.dumps(attrs)])
+
+
+class GraphMLSink(EdgeSink):
+    """
+    A GraphML file, readable by most graph tools. Only the node attributes in GRAPHML_NODE_ATTRIBUTES are kept.
+
+    The edges are written as soon as they are drawn. A node drawn more than once is written once, with all the
+    attributes it was drawn with (like Graphviz does), so the nodes are kept in a temporary database on the disk,
+    and written when the sink is closed. GraphML allows the nodes after the edges.
+    """
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        # an empty file name opens a temporary database on the disk, deleted when it is closed.
+        self.nodes = sqlite3.connect("")
+        self.nodes.execute("CREATE TABLE nodes (name TEXT PRIMARY KEY, attrs TEXT NOT NULL)")
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n<graphml xmlns="' + GRAPHML_NAMESPACE + '">\n')
+        for attribute in GRAPHML_NODE_ATTRIBUTES:
+            self.file.write('  <key id="' + attribute + '" for="node" attr.name="' + attribute +
+                            '" attr.type="string"/>\n')
+        self.file.write('  <key id="graph_label" for="graph" attr.name="label" attr.type="string"/>\n')
+        self.file.write('  <graph id="wikiGraph" edgedefault="directed">\n')
+
+    @staticmethod
+    def data(key, value):
+        return '<data key="' + key + '">' + escape(str(value)) + '</data>'
+
+    def write_node(self, name, attrs):
+        attrs = json.dumps({k: v for k, v in attrs.items() if k in GRAPHML_NODE_ATTRIBUTES})
+        # the attributes of a node drawn again are added to the ones it already has.
+        self.nodes.execute("INSERT INTO nodes VALUES (?, ?) "
+                           "ON CONFLICT (name) DO UPDATE SET attrs = json_patch(attrs, excluded.attrs)", (name, attrs))
+
+    def write_edge(self, tail_name, head_name, attrs):
+        self.file.write("    <edge source=" + quoteattr(tail_name) + " target=" + quoteattr(head_name) + "/>\n")
+
+    def write_graph_attrs(self, attrs):
+        if "label" in attrs:
+            self.file.write("    " + GraphMLSink.data("graph_label", attrs["label"]) + "\n")
+
+    def close(self):
+        for name, attrs in self.nodes.execute("SELECT name, attrs FROM nodes ORDER BY rowid"):
+            self.file.write("    <node id=" + quoteattr(name) + ">" +
+                            "".join(GraphMLSink.data(k, v) for k, v in json.loads(attrs).items()) + "</node>\n")
+        self.nodes.close()
+        self.file.write("  </graph>\n</graphml>\n")
+        super().close()
+
+
+class Tee:
+    """
+    Draws on a few graphs (or sinks) at once.
+    """
+
+    def __init__(self, *targets):
+        self.targets = targets
+
+    def node(self, name, **attrs):
+        for target in self.targets:
+            target.node(name, **attrs)
+
+    def edge(self, tail_name, head_name, **attrs):
+        for target in self.targets:
+            target.edge(tail_name, head_name, **attrs)
+
+    def attr(self, **attrs):
+        for target in self.targets:
+            target.attr(**attrs)
+
+
+def base_name(file_name):
+    """
+    :return: the name of the file without the compression extension: 'edges.jsonl.gz' -> 'edges.jsonl'.
+    """
+    for extension in (".gz", ".bz2"):
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+
+def open_sink(file_name):
+    """
+    Opens the sink matching the extension of the file: .jsonl, .csv or .graphml (optionally .gz or .bz2).
+
+    :param file_name: the file to write.
+    :return: the EdgeSink.
+    """
+    extension = os.path.splitext(base_name(file_name))[1]
+    sinks = {".jsonl": JsonlSink, ".csv": CsvSink, ".graphml": GraphMLSink}
+    if extension not in sinks:
+        raise ValueError("unknown edges file format: " + file_name)
+    return sinks[extension](file_name)
+
+
+def read_records(file_name):
+    """
+    Reads the records written by a sink, in the order they were written.
+
+    :param file_name: the file written by a sink.
+    :return: a generator of ("node", name, attrs), ("edge", (tail, head), attrs) and ("graph", None, attrs).
+    """
+    extension = os.path.splitext(base_name(file_name))[1]
+    if extension == ".graphml":
+        yield from read_graphml_records(file_name)
+        return
+    with open_compressed(file_name, "rt") as f:
+        if extension == ".csv":
+            rows = csv.reader(f)
+            next(rows)
+            for kind, name, head, attrs in rows:
+                yield kind, (name, head) if kind == "edge" else name or None, json.loads(attrs)
+        else:
+            for line in f:
+                record = json.loads(line)
+                if "node" in record:
+                    yield "node", record["node"], record["attrs"]
+                elif "edge" in record:
+                    yield "edge", tuple(record["edge"]), record["attrs"]
+                else:
+                    yield "graph", None, record["graph"]
+
+
+def read_graphml_records(file_name):
+    with open_compressed(file_name) as f:
+        for _, element in ElementTree.iterparse(f):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "node":
+                yield "node", element.get("id"), {data.get("key"): data.text or "" for data in element}
+                element.clear()
+            elif tag == "edge":
+                yield "edge", (element.get("source"), element.get("target")), {}
+                element.clear()
+            elif tag == "data" and element.get("key") == "graph_label":
+                yield "graph", None, {"label": element.text or ""}
+
+
+def load_digraph(file_name, u):
+    """
+    Draws the graph saved by a sink onto a Digraph, like it was drawn when the file was written.
+
+    :param file_name: the file written by a sink.
+    :param u: the graph to draw on.
+    :type u: Digraph
+    :return: the number of nodes drawn.
+    """
+    nodes = set()
+    for kind, name, attrs in read_records(file_name):
+        if kind == "node":
+            u.node(name, **attrs)
+            nodes.add(name)
+        elif kind == "edge":
+            u.edge(name[0], name[1], **attrs)
+        else:
+            u.attr(**attrs)
+    return len(nodes)
+
+
+if __name__ == '__main__':
+    # renders a graph saved by a sink, without crawling again:
+    # python edge_sink.py output/edges.jsonl.gz [svg pdf ...]
+    import helper
+
+    graph = helper.create_digraph()
+    num_of_nodes = load_digraph(sys.argv[1], graph)
+    print("loaded", num_of_nodes, "pages")
+    print("rendered", helper.render_graph(graph, [], sys.argv[2:] or ["svg"],
+                                          file_name=os.path.basename(base_name(sys.argv[1]))))
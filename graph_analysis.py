@@ -0,0 +1,304 @@
+from offline_dump import open_compressed
+import csv
+# to analyse the whole graph with array operations
+import numpy as np
+import sys
+
+# the page all the chains should get to.
+PHILOSOPHY = "Philosophy"
+# the successor of a page with no valid link (or a page we don't know the first link of).
+NO_SUCCESSOR = -1
+
+
+class FirstLinkGraph:
+    """
+    The graph of the first links: every page has (at most) a single successor - the page its first link leads to.
+    The titles are interned to integer ids, and the first links are kept as a NumPy int32 successor array.
+    """
+
+    def __init__(self, titles, successors, is_redirect=None):
+        """
+        :param titles: the list of titles, the title of id i is titles[i].
+        :param successors: the successor id of every id, NO_SUCCESSOR if the page has no successor.
+        :param is_redirect: a boolean array, True for redirect pages. None - no page is a redirect.
+        """
+        self.titles = titles
+        self.ids = {title: i for i, title in enumerate(titles)}
+        self.successors = np.asarray(successors, dtype=np.int32)
+        self.is_redirect = np.zeros(len(titles), dtype=bool) if is_redirect is None else np.asarray(is_redirect)
+
+    def __len__(self):
+        return len(self.titles)
+
+    @staticmethod
+    def from_pairs(pairs, redirects=()):
+        """
+        Creates the graph from (title, first link title) pairs. A first link of None - the page has no valid link.
+
+        :param pairs: an iterable of (title, first link title).
+        :param redirects: the titles of the pages which are redirects.
+        :return: the FirstLinkGraph.
+        """
+        titles = []
+        ids = {}
+        sources = []
+        targets = []
+
+        def intern(title):
+            if title not in ids:
+                ids[title] = len(titles)
+                titles.append(title)
+            return ids[title]
+
+        for title, first_link in pairs:
+            sources.append(intern(title))
+            targets.append(NO_SUCCESSOR if first_link is None else intern(first_link))
+
+        successors = np.full(len(titles), NO_SUCCESSOR, dtype=np.int32)
+        successors[np.asarray(sources, dtype=np.int64)] = np.asarray(targets, dtype=np.int32)
+        is_redirect = np.zeros(len(titles), dtype=bool)
+        is_redirect[[ids[title] for title in redirects if title in ids]] = True
+        return FirstLinkGraph(titles, successors, is_redirect)
+
+    @staticmethod
+    def from_table(file_name):
+        """
+        Loads the graph from a table file (optionally .gz or .bz2), like the one written by offline_dump.py:
+        title <tab> first link title [<tab> revision id <tab> 1 if the page is a redirect].
+        A .csv file is read the same way, with commas instead of tabs (and titles with commas quoted).
+
+        :param file_name: the name of the table file.
+        :return: the FirstLinkGraph.
+        """
+        redirects = []
+
+        def read_pairs():
+            with open_compressed(file_name, "rt") as table:
+                if ".csv" in file_name:
+                    rows = csv.reader(table)
+                else:
+                    # titles can't have tabs in them, but they can start with a quote, so nothing is quoted.
+                    rows = csv.reader(table, delimiter="\t", quoting=csv.QUOTE_NONE)
+                for row in rows:
+                    if len(row) < 2:
+                        continue
+                    if len(row) > 3 and row[3] == "1":
+                        redirects.append(row[0])
+                    yield row[0], row[1] or None
+
+        graph = FirstLinkGraph.from_pairs(read_pairs())
+        graph.is_redirect[[graph.ids[title] for title in redirects]] = True
+        return graph
+
+    @staticmethod
+    def from_memo(memo):
+        """
+        Creates the graph from the pages visited by the crawls.
+
+        :param memo: the ChainMemo of the pages visited.
+        :type memo: ChainMemo
+        :return: the FirstLinkGraph.
+        """
+        return FirstLinkGraph.from_store(memo.store)
+
+    @staticmethod
+    def from_store(store):
+        """
+        Creates the graph from a GraphStore, keeping its ids. The pages never visited have no successor.
+
+        :param store: the GraphStore of the first links.
+        :type store: GraphStore
+        :return: the FirstLinkGraph.
+        """
+        successors = store.successors_array()
+        return FirstLinkGraph(store.titles, np.where(successors < 0, NO_SUCCESSOR, successors))
+
+    def without_redirects(self):
+        """
+        :return: a copy of the successors where every link to a redirect leads straight to the redirect target.
+        """
+        successors = self.successors.copy()
+        ids = np.arange(len(self), dtype=np.int32)
+        for _ in range(len(self)):
+            has_successor = successors != NO_SUCCESSOR
+            to_redirect = np.zeros(len(self), dtype=bool)
+            to_redirect[has_successor] = self.is_redirect[successors[has_successor]]
+            # a redirect to itself would never end
+            to_redirect &= successors != ids
+            if not to_redirect.any():
+                break
+            successors[to_redirect] = successors[successors[to_redirect]]
+        return successors
+
+
+def jump_table_size(n):
+    """
+    :return: the number of doublings needed so 2^k steps cover any chain in a graph of n pages.
+    """
+    return max(1, int(n).bit_length())
+
+
+def reverse_edges(successors):
+    """
+    Groups the nodes by their successor, so the predecessors of a node are a slice of a single array.
+
+    :param successors: the successor array, NO_SUCCESSOR for nodes with no successor.
+    :return: (offsets, predecessors) - the predecessors of node i are predecessors[offsets[i]:offsets[i + 1]].
+    """
+    n = len(successors)
+    has_successor = np.flatnonzero(successors != NO_SUCCESSOR)
+    predecessors = has_successor[np.argsort(successors[has_successor], kind="stable")].astype(np.int32)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(successors[has_successor], minlength=n), out=offsets[1:])
+    return offsets, predecessors
+
+
+def predecessors_of(nodes, offsets, predecessors):
+    """
+    :return: all the predecessors of the nodes, in a single array.
+    """
+    counts = offsets[nodes + 1] - offsets[nodes]
+    # the index of every predecessor: the start of its node's slice, plus its place in the slice.
+    starts = np.repeat(offsets[nodes] - (np.cumsum(counts) - counts), counts)
+    return predecessors[starts + np.arange(int(counts.sum()))]
+
+
+def levels_from(targets_mask, successors):
+    """
+    Computes the distance of every node from a set of target nodes, walking the successors backwards
+    one level at a time (every level is a single array operation, on the nodes of the level only).
+
+    :param targets_mask: a boolean array, True for the target nodes (distance 0).
+    :param successors: the successor array, NO_SUCCESSOR for nodes with no successor.
+    :return: the distance array, -1 for nodes which never reach a target.
+    """
+    offsets, predecessors = reverse_edges(successors)
+    distance = np.full(len(successors), -1, dtype=np.int32)
+    frontier = np.flatnonzero(targets_mask)
+    distance[frontier] = 0
+    level = 0
+    while len(frontier) > 0:
+        level += 1
+        frontier = predecessors_of(frontier, offsets, predecessors)
+        # every node has a single successor, so it is found only once. we skip the targets themselves.
+        frontier = frontier[distance[frontier] == -1]
+        distance[frontier] = level
+    return distance
+
+
+class GraphAnalysis:
+    """
+    Analyses every node of a FirstLinkGraph in bulk:
+    cycle membership, the cycle each chain drains into, the distance to Philosophy and the size of the in-tree.
+    """
+
+    def __init__(self, graph, target=PHILOSOPHY, skip_redirects=True):
+        """
+        :param graph: the FirstLinkGraph to analyse.
+        :param target: the title the chains should get to.
+        :param skip_redirects: True - a link to a redirect leads straight to the redirect target.
+        """
+        self.graph = graph
+        self.target = target
+        n = len(graph)
+        successors = graph.without_redirects() if skip_redirects else graph.successors
+        self.successors = successors
+        ids = np.arange(n, dtype=np.int32)
+        self.is_dead_end = successors == NO_SUCCESSOR
+
+        # dead ends point to themselves, so every chain can be jumped on.
+        jump = np.where(self.is_dead_end, ids, successors)
+        # after n steps every chain is on its cycle (or its dead end). we jump 2^k steps at a time.
+        # the minimal id on the way is the id of the cycle (every node on the cycle is visited on the way).
+        end = jump.copy()
+        cycle_id = ids.copy()
+        for _ in range(jump_table_size(n)):
+            cycle_id = np.minimum(cycle_id, cycle_id[end])
+            end = end[end]
+
+        # the nodes reached after n steps are exactly the nodes on the cycles (and the dead ends).
+        self.on_cycle = np.zeros(n, dtype=bool)
+        self.on_cycle[end] = True
+        self.on_cycle &= ~self.is_dead_end
+        # the id of the cycle (its minimal id) each chain drains into, -1 for chains ending in a dead end.
+        self.drains_into = np.where(self.is_dead_end[end], -1, cycle_id[end]).astype(np.int32)
+
+        # the number of steps until getting onto the cycle (or the dead end).
+        self.depth = levels_from(self.on_cycle | self.is_dead_end, np.where(self.on_cycle, NO_SUCCESSOR, successors))
+
+        # the number of pages whose chain passes through each page (including itself), not counting the loop.
+        self.in_tree_size = np.ones(n, dtype=np.int64)
+        max_depth = int(self.depth.max()) if n else 0
+        order = np.argsort(self.depth, kind="stable")
+        level_starts = np.searchsorted(self.depth[order], np.arange(max_depth + 2))
+        for level in range(max_depth, 0, -1):
+            nodes = order[level_starts[level]:level_starts[level + 1]]
+            np.add.at(self.in_tree_size, successors[nodes], self.in_tree_size[nodes])
+
+        # the number of clicks until reaching the target, -1 if the chain never reaches it.
+        self.distance_to_target = np.full(n, -1, dtype=np.int32)
+        if target in graph.ids:
+            target_id = graph.ids[target]
+            target_mask = np.zeros(n, dtype=bool)
+            target_mask[target_id] = True
+            # we stop at the target, so the loop it is on doesn't matter.
+            without_target_link = successors.copy()
+            without_target_link[target_id] = NO_SUCCESSOR
+            self.distance_to_target = levels_from(target_mask, without_target_link)
+
+    def fraction_reaching_target(self):
+        """
+        :return: the fraction of the pages (not counting redirects) whose chain reaches the target.
+        """
+        articles = ~self.graph.is_redirect
+        return float(np.count_nonzero((self.distance_to_target >= 0) & articles)) / max(1, int(articles.sum()))
+
+    def hops_histogram(self):
+        """
+        :return: an array where index i is the number of pages reaching the target after exactly i clicks.
+        """
+        reaching = self.distance_to_target[(self.distance_to_target >= 0) & ~self.graph.is_redirect]
+        return np.bincount(reaching) if len(reaching) else np.zeros(0, dtype=np.int64)
+
+    def cycles(self):
+        """
+        :return: a dict of cycle id -> the list of titles on the cycle.
+        """
+        cycles = {}
+        for node in np.flatnonzero(self.on_cycle):
+            cycles.setdefault(int(self.drains_into[node]), []).append(self.graph.titles[node])
+        return cycles
+
+    def largest_basins(self, k=10):
+        """
+        :return: the k cycles most chains drain into: a list of (the titles on the cycle, the number of pages).
+        """
+        draining = self.drains_into[self.drains_into >= 0]
+        if len(draining) == 0:
+            return []
+        sizes = np.bincount(draining)
+        biggest = np.argsort(sizes)[::-1][:k]
+        cycles = self.cycles()
+        return [(cycles[int(c)], int(sizes[c])) for c in biggest if sizes[c] > 0]
+
+    def report(self):
+        """
+        :return: lines summarizing the analysis.
+        """
+        n = len(self.graph)
+        hops = self.distance_to_target[(self.distance_to_target >= 0) & ~self.graph.is_redirect]
+        lines = [str(n) + " pages, " + str(int(self.on_cycle.sum())) + " of them on loops, " +
+                 str(int(self.is_dead_end.sum())) + " dead ends.",
+                 "{:.2%}".format(self.fraction_reaching_target()) + " of the pages get to " + self.target + "."]
+        if len(hops):
+            lines.append("clicks to get there: mean {:.2f}, median {}, max {}.".format(
+                float(hops.mean()), int(np.median(hops)), int(hops.max())))
+        lines.append("the loops most pages get to:")
+        for cycle, size in self.largest_basins(5):
+            lines.append("   " + str(size) + " pages -> " + " -> ".join(cycle[:5]) + (" ..." if len(cycle) > 5 else ""))
+        return lines
+
+
+if __name__ == '__main__':
+    # python graph_analysis.py first_links.tsv.gz
+    print("\n".join(GraphAnalysis(FirstLinkGraph.from_table(sys.argv[1])).report()))
@@ -0,0 +1,153 @@
+from array import array
+# to save the successors to disk, and memory-map them back
+import numpy as np
+import os
+import sys
+
+# the successor of a page we never visited.
+NOT_VISITED = -2
+# the successor of a page with no valid link (or a page that doesn't exist).
+NO_LINK = -1
+
+SUCCESSORS_FILE_NAME = "successors.npy"
+TITLES_FILE_NAME = "titles.txt"
+
+
+class GraphStore:
+    """
+    A compact store of the first links graph.
+    Every title is kept once, interned to an integer id, and the first links are kept as an array of ids
+    (4 bytes a page), instead of a WikiPage object with its url, names and html for every page.
+    """
+
+    def __init__(self, titles=None, successors=None):
+        """
+        :param titles: the list of titles, the title of id i is titles[i]. None - an empty store.
+        :param successors: the successor id of every id (NO_LINK or NOT_VISITED if it has none).
+            An array('i'), or a read only NumPy array (like a memory-mapped one) which is copied on the first change.
+        """
+        self.titles = [] if titles is None else titles
+        self.ids = {title: i for i, title in enumerate(self.titles)}
+        self.successors = array("i") if successors is None else successors
+        self.num_visited = int(np.count_nonzero(self.successors_array() != NOT_VISITED))
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, title):
+        """
+        :return: True if the page was visited (its first link is known).
+        """
+        i = self.ids.get(title)
+        return i is not None and self.successors[i] != NOT_VISITED
+
+    def id_of(self, title):
+        """
+        :return: the id of the title, adding it to the store if it is new.
+        """
+        i = self.ids.get(title)
+        if i is None:
+            self.__make_writable()
+            i = len(self.titles)
+            title = sys.intern(title)
+            self.titles.append(title)
+            self.ids[title] = i
+            self.successors.append(NOT_VISITED)
+        return i
+
+    def __make_writable(self):
+        if not isinstance(self.successors, array):
+            successors = array("i")
+            successors.frombytes(np.ascontiguousarray(self.successors, dtype=np.int32).tobytes())
+            self.successors = successors
+
+    def set_successor(self, title, next_title):
+        """
+        Records the first link of a page.
+
+        :param title: the title of the page.
+        :param next_title: the title of the page its first link leads to, None if it has no valid link.
+        :return: None
+        """
+        i = self.id_of(title)
+        next_id = NO_LINK if next_title is None else self.id_of(next_title)
+        self.__make_writable()
+        if self.successors[i] == NOT_VISITED:
+            self.num_visited += 1
+        self.successors[i] = next_id
+
+    def successor(self, title):
+        """
+        :return: the title of the page the first link of the page leads to, None if it has no valid link.
+            raises KeyError if the page was never visited.
+        """
+        next_id = self.successors[self.ids[title]] if title in self.ids else NOT_VISITED
+        if next_id == NOT_VISITED:
+            raise KeyError(title)
+        return None if next_id == NO_LINK else self.titles[next_id]
+
+    def forget(self, title):
+        """
+        Forgets the first link of a page, so it is visited again.
+
+        :return: None
+        """
+        i = self.ids.get(title)
+        if i is not None and self.successors[i] != NOT_VISITED:
+            self.__make_writable()
+            self.successors[i] = NOT_VISITED
+            self.num_visited -= 1
+
+    def pairs(self):
+        """
+        :return: a generator of (title, the title its first link leads to) of the pages visited.
+            None - the page has no valid link.
+        """
+        for i, next_id in enumerate(self.successors):
+            if next_id != NOT_VISITED:
+                yield self.titles[i], None if next_id == NO_LINK else self.titles[next_id]
+
+    def successors_array(self):
+        """
+        :return: the successors as a NumPy int32 array.
+        """
+        if isinstance(self.successors, array):
+            # a copy, since an array('i') can't grow while a NumPy array views it.
+            return np.array(self.successors, dtype=np.int32)
+        return np.asarray(self.successors, dtype=np.int32)
+
+    def save(self, directory):
+        """
+        Saves the store to a directory, so it can be loaded (memory-mapped) in the next runs.
+
+        :param directory: the directory to save the store in.
+        :return: None
+        """
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+        # the files are written next to the old ones and then replace them, since the old successors may be
+        # memory-mapped by this very store.
+        successors_file_name = os.path.join(directory, SUCCESSORS_FILE_NAME)
+        with open(successors_file_name + ".tmp", "wb") as f:
+            np.save(f, self.successors_array())
+        titles_file_name = os.path.join(directory, TITLES_FILE_NAME)
+        with open(titles_file_name + ".tmp", "w", encoding="utf-8") as f:
+            for title in self.titles:
+                f.write(title + "\n")
+        os.replace(successors_file_name + ".tmp", successors_file_name)
+        os.replace(titles_file_name + ".tmp", titles_file_name)
+
+    @staticmethod
+    def load(directory, mmap=True):
+        """
+        Loads a store saved with save().
+
+        :param directory: the directory the store is saved in.
+        :param mmap: True - memory-map the successors instead of reading them into memory.
+            They are read into memory only once the store changes.
+        :return: the GraphStore.
+        """
+        with open(os.path.join(directory, TITLES_FILE_NAME), encoding="utf-8") as f:
+            titles = [sys.intern(title) for title in f.read().split("\n")[:-1]]
+        successors = np.load(os.path.join(directory, SUCCESSORS_FILE_NAME), mmap_mode="r" if mmap else None)
+        return GraphStore(titles, successors)
@@ -0,0 +1,149 @@
+from collections import Counter
+import heapq
+
+# the page all the chains should get to. It is always kept in the summary.
+PHILOSOPHY = "Philosophy"
+# the default maximum number of pages shown in a summary.
+DEFAULT_NODE_BUDGET = 500
+# like in draw_page_path(), we stop following a chain after so many pages.
+MAX_CHAIN_LENGTH = 101
+
+
+class GraphSummary:
+    """
+    A level of detail summary of the graph of many chains, for graphs too big to draw page by page.
+
+    Only the pages most chains pass through (up to a node budget) are kept. The rest are collapsed into groups:
+    a long unbranched chain between two pages kept becomes a single group, and the pages leading into the graph
+    without many chains passing through them are grouped by the page (or the group) they lead to.
+
+    The nodes are keys: ("page", id) for a page kept, ("chain", id) for the chain after the page kept with the id,
+    and ("leaves", key) for the pages leading into the node with the key (None - into no node kept).
+    """
+
+    def __init__(self, store, first_names, node_budget=DEFAULT_NODE_BUDGET, target=PHILOSOPHY):
+        """
+        :param store: the GraphStore of the first links.
+        :type store: GraphStore
+        :param first_names: the names of the first pages of the chains.
+        :param node_budget: the maximum number of pages kept.
+        :param target: the page where the chains stop.
+        """
+        self.store = store
+        # page id -> the number of chains starting from it.
+        self.starts = Counter(store.ids[name] for name in first_names if name in store.ids)
+        # page id -> the id of the next page drawn, None - if the chain stops at it.
+        self.successors = self.chains(target)
+        # page id -> the number of chains passing through it.
+        self.traffic = self.count_traffic()
+
+        target_id = store.ids.get(target)
+        kept = heapq.nlargest(node_budget, self.successors, key=lambda v: (self.traffic[v], self.starts[v]))
+        if target_id in self.successors and target_id not in kept:
+            kept[-1:] = [target_id]
+        self.kept = set(kept)
+
+        # node key -> the number of pages collapsed into it.
+        self.group_sizes = Counter()
+        self.edges = set()
+        # page id -> the key of the group it was collapsed into.
+        self.assigned = {}
+        self.collapse_chains()
+        self.collapse_leaves()
+
+    def chains(self, target):
+        """
+        :return: a dict of page id -> the id of the next page, for every page on the chains of the first pages.
+        """
+        successors = {}
+        target_id = self.store.ids.get(target)
+        for v in self.starts:
+            for _ in range(MAX_CHAIN_LENGTH):
+                if v in successors:
+                    break
+                next_id = int(self.store.successors[v])
+                # the pages not visited, and the pages with no valid link, both end the chain.
+                next_id = None if next_id < 0 or v == target_id else next_id
+                successors[v] = next_id
+                if next_id is None:
+                    break
+                v = next_id
+            else:
+                successors.setdefault(v, None)
+        return successors
+
+    def count_traffic(self):
+        """
+        :return: a dict of page id -> the number of chains passing through it (pages on a loop count only the chains
+            getting into the loop through them).
+        """
+        traffic = {v: self.starts[v] for v in self.successors}
+        in_degree = Counter(w for w in self.successors.values() if w is not None)
+        # we pass the counts down the chains, starting from the pages nothing leads to.
+        ready = [v for v in self.successors if in_degree[v] == 0]
+        while ready:
+            v = ready.pop()
+            w = self.successors[v]
+            if w is None:
+                continue
+            traffic[w] += traffic[v]
+            in_degree[w] -= 1
+            if in_degree[w] == 0:
+                ready.append(w)
+        return traffic
+
+    def node_of(self, v):
+        """
+        :return: the key of the node page v is drawn in, None if it isn't drawn yet.
+        """
+        if v in self.kept:
+            return "page", v
+        return self.assigned.get(v)
+
+    def follow(self, v):
+        """
+        :return: (the pages after v until a page which is drawn already, the key of the node of that page).
+        """
+        path = []
+        on_path = {v}
+        w = self.successors[v]
+        while w is not None and self.node_of(w) is None and w not in on_path:
+            path.append(w)
+            on_path.add(w)
+            w = self.successors[w]
+        return path, None if w is None else self.node_of(w)
+
+    def collapse_chains(self):
+        # the pages between two pages kept are collapsed into a single group.
+        for v in self.kept:
+            path, target = self.follow(v)
+            source = ("page", v)
+            if path:
+                key = ("chain", v)
+                self.group_sizes[key] = len(path)
+                for w in path:
+                    self.assigned[w] = key
+                self.edges.add((source, key))
+                source = key
+            if target is not None:
+                self.edges.add((source, target))
+
+    def collapse_leaves(self):
+        # the pages leading into the graph are grouped by the node they lead to.
+        for v in self.successors:
+            if self.node_of(v) is not None:
+                continue
+            path, target = self.follow(v)
+            path.insert(0, v)
+            if target is not None and target[0] == "leaves":
+                key = target
+            else:
+                key = ("leaves", target)
+                if target is not None:
+                    self.edges.add((key, target))
+            self.group_sizes[key] += len(path)
+            for w in path:
+                self.assigned[w] = key
+
+    def is_first_page(self, v):
+        return self.starts[v] > 0
@@ -1,12 +1,24 @@
 # Written by Tommy Zaft
 
 from WikiPage import WikiPage
-import wikipedia
+from link_cache import LinkCache, CACHE_FILE_NAME
+from chain_memo import ChainMemo, PHILOSOPHY
+from async_crawler import AsyncCrawler
+from sharded_crawl import ShardedCrawler
+from metrics import METRICS, PeriodicReporter, CHAIN_LENGTH_BUCKETS
+from graph_summary import GraphSummary
+from graph_store import GraphStore, SUCCESSORS_FILE_NAME
+from edge_sink import open_sink
+from run_journal import RunJournal, JOURNAL_FILE_NAME, replay_chains
+from name_resolver import NameResolver, NameCache
+# to keep the roads drawn as ids
+from array import array
 # to draw the graph
-from graphviz import Digraph
+from graphviz import Digraph, ExecutableNotFound
 # for saving the file the right way
 import os
-import shutil
+# to run Graphviz
+import subprocess
 # to measure time
 import time
 
@@ -26,6 +38,14 @@ LABEL_FONT_SIZE = '16'
 # Nodes Color documentation: https://graphviz.org/doc/info/colors.html
 FIRST_PAGES_COLOR = "lightskyblue1"
 REGULAR_PAGES_COLOR = "lightskyblue"
+# the color of the nodes standing for a group of pages, in the summary of a large graph.
+GROUPED_PAGES_COLOR = "lightgrey"
+
+# graphs with more pages than this are drawn as a summary, laid out by a layout engine which scales to large graphs.
+LARGE_GRAPH_THRESHOLD = 2000
+LARGE_GRAPH_ENGINE = "sfdp"
+# the maximum number of pages shown in the summary of a large graph.
+NODE_BUDGET = 500
 
 # True - if you want to debug or get information about the program while it's running.
 DEBUG = False
@@ -33,22 +53,131 @@ DEBUG = False
 # Work file name. no need to change :)
 WORK_FILE_NAME = "graph_drawn"
 
+# the files the metrics of a run are saved in (run_metrics.json and run_metrics.prom),
+# and the seconds between two saves during the run.
+METRICS_FILE_NAME = "run_metrics"
+METRICS_INTERVAL = 60
+
+# the pages visited so far, shared by all the graphs drawn in a run.
+CHAIN_MEMO = ChainMemo()
+
+# resolves the names searched to page titles. Caches them only after enable_name_cache().
+NAME_RESOLVER = NameResolver()
+
+# the journal of the run, the chains walked are written to it. None - no journal.
+RUN_JOURNAL = None
+# when resuming a run: the first pages of the graphs started in it, which are drawn again (in the same order).
+RESUMED_STARTS = []
+
+
+def start_run_journal(resume=False, file_name=JOURNAL_FILE_NAME):
+    """
+    Starts writing the journal of the run: the first pages of every graph, and every chain walked.
+    If resume is True, the chains of the previous run are loaded from its journal, so they are not fetched again,
+    and the graphs are drawn again from the same first pages.
+
+    :param resume: True - resume the previous run. False - start a new journal.
+    :param file_name: the file of the journal.
+    :return: the number of chains loaded from the previous run.
+    """
+    global RUN_JOURNAL, RESUMED_STARTS
+    num_of_chains = 0
+    if resume and os.path.exists(file_name):
+        starts, chains = RunJournal.load(file_name)
+        replay_chains(chains, CHAIN_MEMO)
+        RESUMED_STARTS = starts
+        num_of_chains = len(chains)
+        print("Resuming the previous run:", num_of_chains, "chains already walked")
+    RUN_JOURNAL = RunJournal(file_name, append=resume)
+    return num_of_chains
+
+
+def stop_run_journal():
+    """
+    Stops writing the journal of the run, forcing it to the disk.
+
+    :return: None
+    """
+    global RUN_JOURNAL
+    if RUN_JOURNAL is not None:
+        RUN_JOURNAL.close()
+        RUN_JOURNAL = None
+
+
+def resumed_pages(debug=False):
+    """
+    :return: the first pages of the next graph of the run resumed, None if it wasn't started in the previous run.
+    """
+    if not RESUMED_STARTS:
+        return None
+    return [WikiPage.from_name(name, debug) for name in RESUMED_STARTS.pop(0)]
+
+
+def load_graph_store(directory):
+    """
+    Starts the run from the pages visited in the previous runs (saved with save_graph_store()), so the chains passing
+    through them are not walked again. The store is memory-mapped, and read into memory only once it changes.
+
+    :param directory: the directory the store is saved in.
+    :return: the number of pages loaded, 0 if no store was saved there yet.
+    """
+    global CHAIN_MEMO
+    if not os.path.exists(os.path.join(directory, SUCCESSORS_FILE_NAME)):
+        return 0
+    CHAIN_MEMO = ChainMemo(GraphStore.load(directory))
+    print("Loaded", len(CHAIN_MEMO), "pages visited in the previous runs")
+    return len(CHAIN_MEMO)
+
+
+def save_graph_store(directory):
+    """
+    Saves the pages visited so far (including the ones loaded with load_graph_store()), for the next runs.
+
+    :param directory: the directory to save the store in.
+    :return: None
+    """
+    CHAIN_MEMO.store.save(directory)
+
+
+def enable_link_cache(file_name=CACHE_FILE_NAME):
+    """
+    Makes WikiPage save the first link of every page it parses in a persistent cache,
+    and consult it before fetching a page. Pages visited in previous runs are not fetched again.
+
+    :param file_name: the file the cache is saved in.
+    :return: the LinkCache used.
+    """
+    if WikiPage.cache is None:
+        WikiPage.cache = LinkCache(file_name)
+    return WikiPage.cache
+
+
+def enable_name_cache(file_name=CACHE_FILE_NAME):
+    """
+    Makes the names searched be resolved from a persistent cache (next to the first links), so the same names are not
+    searched again in the next runs.
+
+    :param file_name: the file the cache is saved in.
+    :return: the NameCache used.
+    """
+    if NAME_RESOLVER.cache is None:
+        NAME_RESOLVER.cache = NameCache(file_name)
+    return NAME_RESOLVER.cache
+
 
 def autocomplete_search(name_searched):
     """
-    Autocompletes a search to a Wikipedia page name using the wikipedia library.
+    Autocompletes a search to a Wikipedia page name, using NAME_RESOLVER.
+    Redirects are followed, and a disambiguation page isn't a valid autocompletion.
 
     e.g:
     'lebron' -> 'LeBron James',
     'ferari' -> 'Ferrari'
 
     :param name_searched: the name searched
-    :return: the autocompletion
+    :return: the autocompletion, None if there is no valid page for it.
     """
-    search_results = wikipedia.search(name_searched)
-    if len(search_results) < 1:
-        return None
-    return search_results[0]
+    return NAME_RESOLVER.resolve([name_searched])[name_searched]
 
 
 def init_first_page_automatically(name_searched, debug=False):
@@ -64,89 +193,153 @@ def init_first_page_automatically(name_searched, debug=False):
     name = autocomplete_search(name_searched)
     page = None
     if name is not None:
-        page = WikiPage.first_page_init(name, debug)
+        # the name resolver already validated the name, so it isn't checked again.
+        page = WikiPage.from_name(name, debug)
     return page
 
 
-def draw_page_path(page, u, pages_drawn, debug=False):
+def draw_page_path(page, u, pages_drawn, debug=False, memo=None, next_page=None):
     """
     draws the path of the WikiPage page until reaching "Philosophy" or a loop onto the graph.
+    Pages already in the memo are not fetched again, and the path stops once it merges into a page already drawn.
 
     :param page: the WikiPage page to draw path of.
     :type page: WikiPage page
-    :param u: the graph to draw on.
+    :param u: the graph to draw on (or an EdgeSink, or a Tee of both).
     :type u: Digraph
-    :param pages_drawn: the list of the pages drawn so far in the graph.
+    :param pages_drawn: the set of the ids (in memo.store) of the pages drawn so far in the graph.
     :param debug: True - if you want to debug or get information about the program while it's running.
                 False - default
     :type debug: bool
-    :return: returns the 'road' of the page got by clicking the first link in each page. The 'road' is a list containing
-     all the pages names drawn.
+    :param memo: the ChainMemo of the pages visited. None - use the module's CHAIN_MEMO.
+    :type memo: ChainMemo
+    :param next_page: a function getting the next WikiPage in the chain of a page (None - no valid link).
+        None - memo.next_page, which fetches the pages not in the memo.
+    :return: returns the 'road' of the page got by clicking the first link in each page. The 'road' is an array
+     containing the ids (in memo.store) of all the pages drawn.
     """
-    road_of_page = [page.name]
+    if memo is None:
+        memo = CHAIN_MEMO
+    if next_page is None:
+        def next_page(p):
+            return memo.next_page(p, debug)
+    start_time = time.perf_counter()
+    # the time spent getting the next pages, so the time spent building the graph is measured alone.
+    fetch_seconds = 0
+    store = memo.store
+    page_id = store.id_of(page.name)
+    road_of_page = array("i", [page_id])
+    pages_on_road = {page_id}
     count_pages = 0
     # we add the first page node
     u.node(page.name_to_show, URL=page.url, color=FIRST_PAGES_COLOR, fontsize=NODE_FONT_SIZE)
-    while page.name != "Philosophy":
-        next_url = page.get_first_link()
-        # if we got to the limit, reached a dead end or have duplicates in our road.
-        if next_url is None or count_pages > 100 or len(road_of_page) != len(set(road_of_page)):
+    # while we didn't get to the limit
+    while page.name != PHILOSOPHY and count_pages <= 100:
+        fetch_start = time.perf_counter()
+        page_after = next_page(page)
+        fetch_seconds += time.perf_counter() - fetch_start
+        # if we reached a dead end
+        if page_after is None:
             break
-        else:
-            next_page = WikiPage(next_url, debug)
-            road_of_page.append(next_page.name)
-            u.edge(page.name_to_show, next_page.name_to_show)
 
-            count_pages += 1
-            if page.name in pages_drawn:
-                if debug:
-                    print("already drawn", page.name)
-                break
+        next_id = store.id_of(page_after.name)
+        road_of_page.append(next_id)
+        u.edge(page.name_to_show, page_after.name_to_show)
+        count_pages += 1
+
+        if page_id in pages_drawn:
+            if debug:
+                print("already drawn", page.name)
+            break
+        # if we got into a loop
+        if next_id in pages_on_road:
+            break
 
-            # we add the next page node
-            u.node(next_page.name_to_show, URL=next_page.url, fontsize=NODE_FONT_SIZE)
+        # we add the next page node
+        u.node(page_after.name_to_show, URL=page_after.url, fontsize=NODE_FONT_SIZE)
+        pages_on_road.add(next_id)
 
-            page = next_page
-    pages_drawn += road_of_page
+        page = page_after
+        page_id = next_id
+    pages_drawn.update(road_of_page)
+    METRICS.observe("stage_seconds", time.perf_counter() - start_time - fetch_seconds, "graph")
+    METRICS.observe("chain_length", len(road_of_page), buckets=CHAIN_LENGTH_BUCKETS)
     return road_of_page
 
 
-def create_corresponding_copy(const_filename, first_pages, file_format):
+def output_file_name(first_pages):
     """
-    copies the output file generated to the /output folder and and gives it a corresponding name.
+    gives the output files a corresponding name.
     writes the number of first pages drawn in the beginning and three of them in the name.
 
     e.g:
-    "15 Academy Award for Best Live Action Short Film+Kiddo+There are known knowns+Tim Buckley.svg"
+    "15 Academy Award for Best Live Action Short Film+Kiddo+There are known knowns+Tim Buckley"
 
-    :param const_filename: the file name to copy
     :param first_pages: the list of the first pages drawn
-    :param file_format: the file format of the output.
-        e.g:
-        "svg" or "pdf"
-    :return: None
+    :return: the name of the output files, without the extension.
     """
-    new_file_name = str(len(first_pages)) + " " + "+".join(first_pages[:3]) + "." + file_format
+    new_file_name = str(len(first_pages)) + " " + "+".join(first_pages[:3])
 
-    forbidden_file_name_chars = '\*?:/"<>|'
+    forbidden_file_name_chars = '\\*?:/"<>|'
     for c in forbidden_file_name_chars:
         new_file_name = new_file_name.replace(c, '')
+    return new_file_name
 
-    # get the current working dir
-    src_dir = os.getcwd()
 
+def render_graph(u, first_pages, file_formats, engine=None, file_name=None):
+    """
+    Renders the graph straight into the /output folder, in all the formats requested.
+    Graphviz lays out the graph once for all the formats (a single run with a -T and -o pair for each format),
+    and no viewer is opened, so it runs on servers as well.
+
+    :param u: the graph to render.
+    :type u: Digraph
+    :param first_pages: the list of the first pages drawn, to name the output files after.
+    :param file_formats: the file formats of the output.
+        e.g:
+        ["svg", "pdf"]
+    :param engine: the Graphviz layout engine, e.g "dot" or "sfdp". None - the engine of the graph.
+    :param file_name: the name of the output files, without the extension. None - named after the first pages.
+    :return: the list of the paths of the files rendered.
+    """
     if not os.path.exists("output"):
         os.mkdir('output')
-    dst_file = os.path.join(src_dir, "output", new_file_name)
-    src_file = os.path.join(src_dir, const_filename + "." + file_format)
-    # copy the file to destination dir
-    shutil.copy(src_file, dst_file)
+    path = os.path.join("output", file_name or output_file_name(first_pages))
+
+    command = [engine or u.engine]
+    output_files = []
+    for file_format in file_formats:
+        output_files.append(path + "." + file_format)
+        command += ["-T" + file_format, "-o", output_files[-1]]
+
+    with METRICS.stage("render"):
+        try:
+            subprocess.run(command, input=u.source.encode("utf-8"), check=True)
+        except FileNotFoundError:
+            raise ExecutableNotFound(command)
+    return output_files
 
 
-def draw_list_of_pages(pages, u, debug=False):
+def open_edge_sink(file_format):
+    """
+    Opens a sink saving the nodes and the edges to the /output folder as soon as they are drawn.
+
+    :param file_format: the format of the file: "jsonl", "csv" or "graphml", optionally compressed ("jsonl.gz").
+    :return: the EdgeSink opened.
+    """
+    if not os.path.exists("output"):
+        os.mkdir('output')
+    return open_sink(os.path.join("output", "edges " + datetime.now().strftime("%Y-%m-%d %H-%M-%S") + "." +
+                                  file_format))
+
+
+def draw_list_of_pages(pages, u, debug=False, concurrency=None, processes=None):
     """
     Draws a list of pages onto the graph.
     for each page we draw its path using draw_page_path().
+    If concurrency is given, the chains of all the pages are first walked concurrently by an AsyncCrawler,
+    so drawing them afterwards doesn't fetch anything. If processes is given, they are first walked by a
+    ShardedCrawler in that many worker processes instead.
     The function also prints it's progress in percentage.
     It prints when finished going over 25%,50%,75% and 100% of the page names.
 
@@ -157,9 +350,23 @@ def draw_list_of_pages(pages, u, debug=False):
     :param debug: True - if you want to debug or get information about the program while it's running.
                 False - default
     :type debug: bool
+    :param concurrency: the maximum number of pages fetched at the same time.
+        None - default, the pages are fetched one at a time.
+    :param processes: the number of worker processes walking the chains. None - default, a single process.
     :return: the list of the first pages drawn (the names of the first pages) and the total number of pages drawn.
     """
-    pages_drawn = []
+    if RUN_JOURNAL is not None:
+        RUN_JOURNAL.starts(page.name for page in pages)
+    # a crawler writes the chains to the journal as it walks them, so they are not written again when drawn.
+    crawled = processes is not None or concurrency is not None
+    if processes is not None:
+        print("Walking", len(pages), "pages in", processes, "processes ...")
+        ShardedCrawler(CHAIN_MEMO, processes, debug, RUN_JOURNAL).crawl(pages)
+    elif concurrency is not None:
+        print("Walking", len(pages), "pages concurrently ...")
+        AsyncCrawler(CHAIN_MEMO, concurrency, debug, RUN_JOURNAL).crawl(pages)
+
+    pages_drawn = set()
     first_pages_drawn = []
 
     percentage_to_alert = [25, 50, 75, 100]
@@ -168,8 +375,11 @@ def draw_list_of_pages(pages, u, debug=False):
 
     for page in pages:
         print("Working on", page.name, "...")
-        draw_page_path(page, u, pages_drawn, debug)
+        road_of_page = draw_page_path(page, u, pages_drawn, debug)
         first_pages_drawn.append(page.name)
+        if RUN_JOURNAL is not None and not crawled:
+            names = [CHAIN_MEMO.store.titles[i] for i in road_of_page]
+            RUN_JOURNAL.chain(names, names[-1] in CHAIN_MEMO and CHAIN_MEMO.store.successor(names[-1]) is None)
 
         if index_in_names in indexes_to_alert_on:
             i = indexes_to_alert_on.index(index_in_names)
@@ -182,7 +392,7 @@ def draw_list_of_pages(pages, u, debug=False):
     return first_pages_drawn, len(pages_drawn)
 
 
-def draw_list_of_page_names(names, u, debug=False):
+def draw_list_of_page_names(names, u, debug=False, concurrency=None, processes=None):
     """
     Draws a list of page names onto the graph.
     for each page name  we generate a WikiPage using init_first_page_automatically().
@@ -194,23 +404,83 @@ def draw_list_of_page_names(names, u, debug=False):
     :param debug: True - if you want to debug or get information about the program while it's running.
                 False - default
     :type debug: bool
+    :param concurrency: the maximum number of pages fetched at the same time.
+        None - default, the pages are fetched one at a time.
+    :param processes: the number of worker processes walking the chains. None - default, a single process.
     :return: the list of the first pages drawn (the names of the first pages) and the total number of pages drawn.
     """
     not_found_names = []
 
+    pages_to_draw = resumed_pages(debug)
+    if pages_to_draw is not None:
+        return draw_list_of_pages(pages_to_draw, u, debug, concurrency, processes)
     pages_to_draw = []
 
+    # we autocomplete all the names at once: they are searched concurrently, and validated together.
+    autocompleted_names = NAME_RESOLVER.resolve(names)
+
     for name in names:
-        first_page = init_first_page_automatically(name, debug)
-        if first_page is None:
+        if autocompleted_names[name] is None:
             print("Didn't find", name)
             not_found_names.append(name)
         else:
-            pages_to_draw.append(first_page)
+            pages_to_draw.append(WikiPage.from_name(autocompleted_names[name], debug))
+
+    return draw_list_of_pages(pages_to_draw, u, debug, concurrency, processes)
+
+
+def draw_list_of_titles_from_index(titles, u, index, debug=False):
+    """
+    Draws a list of page titles onto the graph, taking their chains from a PathIndex instead of fetching them.
+
+    :param titles: the titles of the pages to draw.
+    :param u: the graph to draw on.
+    :type u: Digraph
+    :param index: the index of the first links.
+    :type index: PathIndex
+    :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+    :type debug: bool
+    :return: the list of the first pages drawn (the names of the first pages) and the total number of pages drawn.
+    """
+    pages_to_draw = []
+    for title in titles:
+        # the titles in the index start with a capital letter
+        if title not in index:
+            title = title[:1].upper() + title[1:]
+        if title not in index:
+            print("Didn't find", title)
+        else:
+            pages_to_draw.append(index.fill_memo(CHAIN_MEMO, title, debug))
 
     return draw_list_of_pages(pages_to_draw, u, debug)
 
 
+def draw_in_tree(title, u, index, max_depth=None, top_k=None):
+    """
+    Draws everything that flows through a page onto the graph: all the pages whose chain passes through it.
+
+    :param title: the title of the page.
+    :param u: the graph to draw on.
+    :type u: Digraph
+    :param index: the index of the predecessors of the pages.
+    :type index: PredecessorIndex
+    :param max_depth: the maximum number of clicks from a page to the page given. None - no limit.
+    :param top_k: draw only the k predecessors with the biggest in-trees of every page. None - draw all.
+    :return: the number of pages drawn.
+    """
+    root = WikiPage.from_name(title)
+    u.node(root.name_to_show, URL=root.url, color=FIRST_PAGES_COLOR, fontsize=NODE_FONT_SIZE)
+    pages_drawn = {title}
+    for page_title, next_title in index.in_tree(title, max_depth, top_k):
+        page = WikiPage.from_name(page_title)
+        if page_title not in pages_drawn:
+            u.node(page.name_to_show, URL=page.url, fontsize=NODE_FONT_SIZE)
+            pages_drawn.add(page_title)
+        u.edge(page.name_to_show, WikiPage.from_name(next_title).name_to_show)
+    return len(pages_drawn)
+
+
 def create_label_for_output_file(first_pages_drawn, time_in_minutes, total_num_drawn):
     """
     creates a label for a graph drawn, for example:
@@ -228,7 +498,7 @@ def create_label_for_output_file(first_pages_drawn, time_in_minutes, total_num_d
     return label
 
 
-def draw_random_pages(u, num_of_pages, debug=False):
+def draw_random_pages(u, num_of_pages, debug=False, concurrency=None, processes=None):
     """
     draws random pages using draw_list_of_pages()
 
@@ -238,13 +508,16 @@ def draw_random_pages(u, num_of_pages, debug=False):
     :param debug: True - if you want to debug or get information about the program while it's running.
                 False - default
     :type debug: bool
+    :param concurrency: the maximum number of pages fetched at the same time.
+        None - default, the pages are fetched one at a time.
+    :param processes: the number of worker processes walking the chains. None - default, a single process.
     :return: the list of the first pages drawn (the names of the first pages) and the total number of pages drawn.
     """
-    pages_to_draw = []
-    for _ in range(num_of_pages):
-        pages_to_draw.append(WikiPage.get_random_page(debug))
+    pages_to_draw = resumed_pages(debug)
+    if pages_to_draw is None:
+        pages_to_draw = WikiPage.get_random_pages(num_of_pages, debug)
 
-    first_pages, num_drawn = draw_list_of_pages(pages_to_draw, u, debug)
+    first_pages, num_drawn = draw_list_of_pages(pages_to_draw, u, debug, concurrency, processes)
     return first_pages, num_drawn
 
 
@@ -260,6 +533,48 @@ def create_digraph():
     return u
 
 
+def summarize_large_graph(u, first_pages, total_num_drawn, node_budget=NODE_BUDGET, memo=None):
+    """
+    If the graph is too big to draw page by page, replaces it with a summary: only the pages most chains pass through
+    are kept, and the rest are collapsed into nodes counting the pages in them (see GraphSummary).
+    The summary is laid out with LARGE_GRAPH_ENGINE instead of dot.
+
+    :param u: the graph drawn.
+    :type u: Digraph
+    :param first_pages: the list of the first pages drawn (the names of the first pages).
+    :param total_num_drawn: the total number of pages drawn.
+    :param node_budget: the maximum number of pages shown.
+    :param memo: the ChainMemo of the pages visited. None - use the module's CHAIN_MEMO.
+    :type memo: ChainMemo
+    :return: the graph to render: u itself if it is small enough, otherwise the summary.
+    """
+    if total_num_drawn <= LARGE_GRAPH_THRESHOLD:
+        return u
+    if memo is None:
+        memo = CHAIN_MEMO
+    summary = GraphSummary(memo.store, first_pages, node_budget)
+    print("Drawing a summary of", total_num_drawn, "pages, with", len(summary.kept), "of them ...")
+
+    g = Digraph('unix', filename=WORK_FILE_NAME, strict=True, engine=LARGE_GRAPH_ENGINE,
+                node_attr={'color': REGULAR_PAGES_COLOR, 'style': 'filled'}, )
+    g.attr(overlap='prism', outputorder='edgesfirst')
+    names = {}
+    for v in summary.kept:
+        page = WikiPage.from_name(memo.store.titles[v])
+        names["page", v] = page.name_to_show
+        if summary.is_first_page(v):
+            g.node(page.name_to_show, URL=page.url, color=FIRST_PAGES_COLOR, fontsize=NODE_FONT_SIZE)
+        else:
+            g.node(page.name_to_show, URL=page.url, fontsize=NODE_FONT_SIZE)
+    for i, (key, size) in enumerate(summary.group_sizes.items()):
+        names[key] = "group " + str(i)
+        g.node(names[key], label=str(size) + (" pages" if size > 1 else " page"), shape='box',
+               color=GROUPED_PAGES_COLOR, fontsize=NODE_FONT_SIZE)
+    for source, target in summary.edges:
+        g.edge(names[source], names[target])
+    return g
+
+
 def print_running_report(current_time, start_time, num_of_first_pages):
     """
     prints  details about the run:
@@ -274,10 +589,33 @@ def print_running_report(current_time, start_time, num_of_first_pages):
     time_in_minutes = "{:.2f}".format((current_time - start_time) / 60)
     print("run ended after:", time_in_minutes, "minutes")
     print("ran on", num_of_first_pages, "names")
+    counters = METRICS.to_json()["counters"]
+    if counters.get("lead_fetches", 0) > 0:
+        print("no link in the lead section of", counters.get("lead_fallbacks", 0), "out of", counters["lead_fetches"],
+              "pages fetched")
+    if WikiPage.link_rules.count_hits:
+        print("links rejected by each rule:")
+        for line in WikiPage.link_rules.report():
+            print("  ", line)
+    print("where the time went:")
+    for line in METRICS.report():
+        print("  ", line)
     return time_in_minutes
 
 
-def handpick_and_draw(num_of_pages_to_draw, u, debug=False):
+def start_metrics_reporter(file_name=METRICS_FILE_NAME, interval=METRICS_INTERVAL):
+    """
+    Starts saving the metrics of the run (as json and in the Prometheus text format) every interval seconds.
+    Call stop() on the reporter returned at the end of the run, to save them one last time.
+
+    :param file_name: the name of the files, without the extension.
+    :param interval: the seconds between two saves.
+    :return: the PeriodicReporter started.
+    """
+    return PeriodicReporter(METRICS, file_name, interval).start()
+
+
+def handpick_and_draw(num_of_pages_to_draw, u, debug=False, concurrency=None, processes=None):
     """
     Allows the user to choose manually the first pages to draw on the digraph.
 
@@ -286,13 +624,18 @@ def handpick_and_draw(num_of_pages_to_draw, u, debug=False):
     :param debug: True - if you want to debug or get information about the program while it's running.
                 False - default
     :type debug: bool
+    :param concurrency: the maximum number of pages fetched at the same time.
+        None - default, the pages are fetched one at a time.
+    :param processes: the number of worker processes walking the chains. None - default, a single process.
     :return: the list of the first pages drawn (the names of the first pages) and the total number of pages drawn.
     """
-    pages_to_draw = []
-    for _ in range(num_of_pages_to_draw):
-        pages_to_draw.append(WikiPage.choose_first_page_manually())
+    pages_to_draw = resumed_pages(debug)
+    if pages_to_draw is None:
+        pages_to_draw = []
+        for _ in range(num_of_pages_to_draw):
+            pages_to_draw.append(WikiPage.choose_first_page_manually())
 
-    return draw_list_of_pages(pages_to_draw, u, debug)
+    return draw_list_of_pages(pages_to_draw, u, debug, concurrency, processes)
 
 
 def main():
@@ -306,6 +649,8 @@ def main():
     """
     output_file_formats = ["svg", "pdf"]
 
+    enable_link_cache()
+
     num_of_pages = [20]
     for i in num_of_pages:
         if i < 1:
@@ -337,11 +682,8 @@ def main():
         u.attr(label=create_label_for_output_file(first_pages, time_in_minutes, total_num_drawn),
                fontsize=LABEL_FONT_SIZE)
 
-        for output_format in output_file_formats:
-            u.format = output_format
-            u.view()
-            # we create a copy of the graph we just generated, save it in ./output folder and give it a useful name.
-            create_corresponding_copy(WORK_FILE_NAME, first_pages, output_format)
+        # we render the graph into the ./output folder, and give it a useful name.
+        render_graph(u, first_pages, output_file_formats)
 
 
 if __name__ == '__main__':
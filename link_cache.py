@@ -0,0 +1,128 @@
+from collections import namedtuple
+import sqlite3
+import threading
+import time
+
+# the default file the first links are saved in.
+CACHE_FILE_NAME = "first_links.sqlite"
+# milliseconds a connection waits for another process writing to the cache, before giving up.
+BUSY_TIMEOUT_MS = 30000
+
+# a single cached entry:
+# first_link - the href of the first link in the page (None if the page has no valid link).
+# name - the name of the page after following redirects.
+# revid - the revision of the page the first link was computed from.
+# fetched_at - when the first link was computed (seconds since the epoch).
+CachedLink = namedtuple("CachedLink", ["first_link", "name", "revid", "fetched_at"])
+
+
+class LinkCache:
+    """
+    A persistent on-disk cache mapping a Wikipedia page name to the first link in it.
+    The cache is consulted before sending any HTTP request, so pages we already visited in a previous run
+    don't need to be fetched and parsed again.
+
+    The cache is in WAL mode, so a few processes can share it: readers don't wait for a writer.
+    """
+
+    def __init__(self, file_name=CACHE_FILE_NAME):
+        self.file_name = file_name
+        # the connection may be used from more than one thread, so we guard it with a lock.
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_name, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA busy_timeout=" + str(BUSY_TIMEOUT_MS))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS first_links ("
+                                "title TEXT PRIMARY KEY, "
+                                "first_link TEXT, "
+                                "name TEXT NOT NULL, "
+                                "revid INTEGER, "
+                                "fetched_at REAL NOT NULL)")
+        # the pages a process is fetching right now, so other processes wait for it instead of fetching them too.
+        self.connection.execute("CREATE TABLE IF NOT EXISTS claims (title TEXT PRIMARY KEY, claimed_at REAL NOT NULL)")
+        self.connection.commit()
+
+    def get(self, title):
+        """
+        Gets the cached first link of a page.
+
+        :param title: the name of the page.
+        :return: the CachedLink of the page, or None if the page is not in the cache.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT first_link, name, revid, fetched_at FROM first_links "
+                                          "WHERE title = ?", (title,)).fetchone()
+        if row is None:
+            return None
+        return CachedLink(*row)
+
+    def put(self, title, first_link, name, revid):
+        """
+        Saves the first link of a page.
+
+        :param title: the name of the page, as it was requested.
+        :param first_link: the href of the first link in the page, None if the page has no valid link.
+        :param name: the name of the page after following redirects.
+        :param revid: the revision of the page the first link was computed from.
+        :return: None
+        """
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO first_links VALUES (?, ?, ?, ?, ?)",
+                                    (title, first_link, name, revid, time.time()))
+            self.connection.commit()
+
+    def claim(self, title):
+        """
+        Claims a page before fetching it, so other processes sharing the cache don't fetch it at the same time.
+
+        :param title: the name of the page.
+        :return: True - the page is ours to fetch. False - another process claimed it already.
+        """
+        with self.lock:
+            claimed = self.connection.execute("INSERT OR IGNORE INTO claims VALUES (?, ?)", (title, time.time()))
+            self.connection.commit()
+        return claimed.rowcount == 1
+
+    def is_claimed(self, title):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM claims WHERE title = ?", (title,)).fetchone() is not None
+
+    def release(self, title):
+        """
+        Releases a page claimed, after it was fetched (or fetching it failed).
+
+        :param title: the name of the page.
+        :return: None
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM claims WHERE title = ?", (title,))
+            self.connection.commit()
+
+    def clear_claims(self):
+        """
+        Releases all the pages claimed, e.g the claims left by a crawl which crashed.
+
+        :return: None
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM claims")
+            self.connection.commit()
+
+    def entries(self):
+        """
+        :return: a list of (title, CachedLink) of all the pages in the cache.
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT title, first_link, name, revid, fetched_at FROM first_links").fetchall()
+        return [(row[0], CachedLink(*row[1:])) for row in rows]
+
+    def __contains__(self, title):
+        return self.get(title) is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM first_links").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
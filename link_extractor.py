@@ -0,0 +1,188 @@
+from metrics import METRICS
+from html.parser import HTMLParser
+import re
+import time
+
+# tags which never have an end tag, so they are never a parent of a link.
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track",
+             "wbr"}
+# tags starting a new block of text. Brackets opened in one block don't enclose links in another one.
+BLOCK_TAGS = {"p", "li", "dd", "dt", "td", "th", "div", "table", "ul", "ol", "dl", "blockquote", "caption",
+              "h1", "h2", "h3", "h4", "h5", "h6"}
+
+# tags whose content is code, not a part of the text.
+CODE_TAGS = {"script", "style"}
+
+BRACKETS_PATTERN = re.compile("[()]")
+
+# the size of the html pieces fed to the parser. We stop feeding once the first link is found.
+CHUNK_SIZE = 4096
+
+
+class FirstLinkExtractor(HTMLParser):
+    """
+    A streaming parser which finds the first valid link in the html of a page, and stops parsing right there.
+    Instead of building the whole tree of the page, it keeps only the stack of the tags we are inside of,
+    and the bracket depth of the text read so far in each block of text.
+
+    The links are checked with the same LinkRules as WikiPage.is_href_valid().
+    """
+
+    def __init__(self, rules):
+        """
+        :param rules: the rules of a valid link.
+        :type rules: LinkRules
+        """
+        super().__init__(convert_charrefs=True)
+        self.rules = rules
+        # the tags we are inside of: (tag, is it a block of text, its classes joined by '_', its id).
+        self.stack = []
+        # the bracket depth in each block of text we are inside of.
+        self.bracket_depths = [0]
+        # the link we are inside of, if it may be the first link.
+        self.candidate = None
+        self.first_link = None
+        # the time spent checking the links against the rules.
+        self.validate_seconds = 0
+
+    def find_first_link(self, html):
+        """
+        Finds the first valid link in the html.
+
+        :param html: the html of the page.
+        :return: the href of the first valid link, None if there is no valid link.
+        """
+        for i in range(0, len(html), CHUNK_SIZE):
+            self.feed(html[i:i + CHUNK_SIZE])
+            if self.first_link is not None:
+                break
+        else:
+            self.close()
+        METRICS.observe("stage_seconds", self.validate_seconds, "validate")
+        return self.first_link
+
+    def handle_starttag(self, tag, attrs):
+        if self.first_link is not None:
+            return
+        attrs = dict(attrs)
+        if self.candidate is not None:
+            # the link text has tags in it
+            self.candidate.has_tags = True
+        if tag == "a" and self.candidate is None and "href" in attrs:
+            link = StreamLink(self, attrs)
+            validate_start = time.perf_counter()
+            if self.rules.reject_reason(link, self.rules.tag_rules) is None:
+                self.candidate = link
+            self.validate_seconds += time.perf_counter() - validate_start
+        if tag in VOID_TAGS:
+            return
+
+        is_block = tag in BLOCK_TAGS
+        if is_block:
+            self.bracket_depths.append(0)
+        link_class = attrs.get("class")
+        self.stack.append((tag, is_block, None if link_class is None else "_".join(link_class.split()),
+                           attrs.get("id")))
+
+    def handle_startendtag(self, tag, attrs):
+        # a self closing tag, like <br/>. it can't contain a link.
+        if self.candidate is not None:
+            self.candidate.has_tags = True
+
+    def handle_endtag(self, tag):
+        if self.first_link is not None:
+            return
+        if tag == "a" and self.candidate is not None:
+            link = self.candidate
+            self.candidate = None
+            validate_start = time.perf_counter()
+            is_valid = self.rules.reject_reason(link, self.rules.text_rules) is None
+            self.validate_seconds += time.perf_counter() - validate_start
+            if is_valid:
+                self.first_link = link.url
+                return
+
+        # we close every tag opened after the one closed (like html.parser does with tags left unclosed).
+        if not any(open_tag[0] == tag for open_tag in self.stack):
+            return
+        while self.stack:
+            open_tag, is_block, _, _ = self.stack.pop()
+            if is_block:
+                self.bracket_depths.pop()
+            if open_tag == tag:
+                break
+
+    def handle_comment(self, data):
+        # a comment splits the text of the link, like a tag does.
+        if self.candidate is not None:
+            self.candidate.has_tags = True
+
+    def handle_data(self, data):
+        if self.first_link is not None or (self.stack and self.stack[-1][0] in CODE_TAGS):
+            return
+        if self.candidate is not None:
+            self.candidate.text += data
+        depth = self.bracket_depths[-1]
+        for bracket in BRACKETS_PATTERN.findall(data):
+            if bracket == "(":
+                depth += 1
+            elif depth > 0:
+                depth -= 1
+        self.bracket_depths[-1] = depth
+
+
+class StreamLink:
+    """
+    A link seen by the FirstLinkExtractor, checked by LinkRules.
+    Its parents are read from the stack of the extractor, so the tag rules must be checked when the link opens.
+    """
+
+    __slots__ = ("extractor", "url", "link_class", "parent_tag", "in_brackets", "text", "has_tags")
+
+    def __init__(self, extractor, attrs):
+        self.extractor = extractor
+        self.url = attrs["href"] or ""
+        self.link_class = "_".join((attrs.get("class") or "").split())
+        self.parent_tag = extractor.stack[-1][0] if extractor.stack else None
+        self.in_brackets = extractor.bracket_depths[-1] > 0
+        self.text = ""
+        self.has_tags = False
+
+    @property
+    def text_is_or(self):
+        return not self.has_tags and self.text == "or"
+
+    def ancestors(self):
+        stack = self.extractor.stack
+        return ([c for _, _, c, _ in stack if c is not None],
+                [i for _, _, _, i in stack if i is not None])
+
+
+def compare_with_soup(file_names):
+    """
+    Compares the link chosen by the FirstLinkExtractor with the link chosen by the BeautifulSoup parser,
+    on pages saved as html files.
+
+    :param file_names: the names of the html files.
+    :return: the list of files where the links chosen are different: (file name, streaming link, soup link).
+    """
+    from WikiPage import WikiPage
+
+    different = []
+    page = WikiPage("/wiki/Philosophy")
+    for file_name in file_names:
+        with open(file_name, encoding="utf-8") as f:
+            html = f.read()
+        streaming_link = FirstLinkExtractor(WikiPage.link_rules).find_first_link(html)
+        soup_link = page.find_first_link_with_soup(html)
+        print(file_name, ":", streaming_link, "same" if streaming_link == soup_link else "!= " + str(soup_link))
+        if streaming_link != soup_link:
+            different.append((file_name, streaming_link, soup_link))
+    return different
+
+
+if __name__ == '__main__':
+    # python link_extractor.py saved_pages/*.html
+    import sys
+
+    sys.exit(1 if compare_with_soup(sys.argv[1:]) else 0)
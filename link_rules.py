@@ -0,0 +1,155 @@
+import re
+
+# the rules of a valid first link
+# ---------------------------------
+# link classes of an external text, a disambiguation link or an infobox data link.
+WIKIPEDIA_CLASSES = ["external_text", "mw-disambig", "infobox-data"]
+# url prefixes of pages which are not articles.
+WIKIPEDIA_KEYWORDS = ["Help", "Category", "Wikipedia", "Template", "File", "Talk", "Special", "Portal"]
+# a link in these tags is a side-comment: italicized, smaller text or supper text.
+WIKIPEDIA_NOT_NEEDED_TAGS = ['small', 'sup', 'i']
+# links inside parents with these classes are not a part of the main text.
+# 'toc' - the Contents menu class
+# 'mw-editsection' - the Edit section
+# 'thumbcaption' - a Photo Caption
+# 'hlist' - a list like in: https://en.wikipedia.org/wiki/January
+WIKIPEDIA_CLASSES_TO_IGNORE = ["thumbcaption", "infobox", "navigation-not-searchable", "sidebar", "box-text",
+                               "toc", "mw-editsection", "thumb", "hlist", "navbox"]
+# links inside parents with these ids are not a part of the main text. 'coordinates' - a coordinates href.
+WIKIPEDIA_IDS_TO_IGNORE = ["coordinates"]
+
+
+class LinkRules:
+    """
+    The rules deciding if a link is a valid first link, compiled once into an ordered pipeline.
+    The cheap string checks on the url come first, and the checks walking the parents of the link come last.
+
+    A link is checked through an object with the following attributes:
+    url, link_class (the classes of the link joined by '_'), parent_tag, in_brackets, text_is_or,
+    and ancestors() - returns the classes (joined by '_') and the ids of all the parents of the link.
+    """
+
+    def __init__(self, count_hits=False):
+        """
+        :param count_hits: True - count how many links each rule checked and rejected.
+        """
+        self.count_hits = count_hits
+
+        namespaces_pattern = re.compile("|".join(re.escape(keyword + ":") for keyword in WIKIPEDIA_KEYWORDS))
+        # if the page is a file
+        file_pattern = re.compile(r"\.[a-zA-Z]{3,4}$")
+        link_classes_pattern = re.compile("|".join(re.escape(c) for c in WIKIPEDIA_CLASSES))
+        parent_classes_pattern = re.compile("|".join(re.escape(c) for c in WIKIPEDIA_CLASSES_TO_IGNORE))
+        not_needed_tags = frozenset(WIKIPEDIA_NOT_NEEDED_TAGS)
+        ids_to_ignore = frozenset(WIKIPEDIA_IDS_TO_IGNORE)
+
+        # the rules we can check as soon as we see the link. each rule returns True if it rejects the link.
+        self.tag_rules = [
+            # if it doesn't lead to a wiki page
+            ("not a wiki link", lambda link: not link.url.startswith("/wiki/")),
+            ("section link", lambda link: "#" in link.url),
+            ("other project", lambda link: "wikimedia" in link.url or "wiktionary" in link.url),
+            ("not an article", lambda link: namespaces_pattern.search(link.url) is not None),
+            ("file", lambda link: file_pattern.search(link.url) is not None),
+            # if the class is an external text class, or a disambiguation link
+            ("link class", lambda link: link_classes_pattern.search(link.link_class) is not None),
+            ("side-comment", lambda link: link.parent_tag in not_needed_tags),
+            ("ignored parent class",
+             lambda link: any(parent_classes_pattern.search(c) for c in link.ancestors()[0])),
+            # if it is a coordinates href
+            ("ignored parent id", lambda link: any(i in ids_to_ignore for i in link.ancestors()[1])),
+            ("in brackets", lambda link: link.in_brackets),
+        ]
+        # the rules we can check only after reading the text of the link.
+        self.text_rules = [
+            # if the href shows two different spellings. like in: https://en.wikipedia.org/wiki/Carbon_fibers
+            # Carbon fibers ~or~ carbon fibres - here or is the href.
+            ("two spellings", lambda link: link.text_is_or),
+        ]
+        self.rules = self.tag_rules + self.text_rules
+
+        self.checks = {}
+        self.hits = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.checks = {name: 0 for name, _ in self.rules}
+        self.hits = {name: 0 for name, _ in self.rules}
+
+    def reject_reason(self, link, rules=None):
+        """
+        Runs the link through the rules, until one of them rejects it.
+
+        :param link: the link to check.
+        :param rules: the rules to run. None - all the rules.
+        :return: the name of the rule rejecting the link, None if the link is valid.
+        """
+        for name, rule in self.rules if rules is None else rules:
+            if self.count_hits:
+                self.checks[name] += 1
+            if rule(link):
+                if self.count_hits:
+                    self.hits[name] += 1
+                return name
+        return None
+
+    def is_valid(self, link):
+        return self.reject_reason(link) is None
+
+    def report(self):
+        """
+        :return: lines describing how many links each rule checked and rejected, the most selective rule first.
+        """
+        names = sorted(self.hits, key=lambda n: self.hits[n], reverse=True)
+        return [name + ": rejected " + str(self.hits[name]) + " out of " + str(self.checks[name]) + " links"
+                for name in names]
+
+
+class SoupLink:
+    """
+    A BeautifulSoup link checked by LinkRules. The parents of the link are walked only once, and only if needed.
+    """
+
+    __slots__ = ("tag", "url", "is_enclosed_in_brackets", "parents_classes_and_ids")
+
+    def __init__(self, tag, is_enclosed_in_brackets):
+        """
+        :param tag: the BeautifulSoup link.
+        :type tag bs4.element.Tag
+        :param is_enclosed_in_brackets: a function checking if a BeautifulSoup link is enclosed in brackets.
+        """
+        self.tag = tag
+        self.url = str(tag["href"])
+        self.is_enclosed_in_brackets = is_enclosed_in_brackets
+        self.parents_classes_and_ids = None
+
+    @property
+    def link_class(self):
+        link_class = self.tag.get("class")
+        return "" if link_class is None else "_".join(link_class)
+
+    @property
+    def parent_tag(self):
+        return self.tag.parent.name
+
+    @property
+    def in_brackets(self):
+        return self.is_enclosed_in_brackets(self.tag)
+
+    @property
+    def text_is_or(self):
+        return self.tag.contents == ["or"]
+
+    def ancestors(self):
+        if self.parents_classes_and_ids is None:
+            classes = []
+            ids = []
+            for parent in self.tag.parents:
+                parent_class = parent.get("class")
+                if parent_class is not None:
+                    classes.append("_".join(parent_class))
+                parent_id = parent.get("id")
+                if parent_id is not None:
+                    ids.append(parent_id)
+            self.parents_classes_and_ids = (classes, ids)
+        return self.parents_classes_and_ids
@@ -0,0 +1,210 @@
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+# the upper bounds of the buckets of the stage timings (seconds), and of the chain lengths (pages).
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CHAIN_LENGTH_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 101)
+
+# every metric exported starts with it.
+PREFIX = "wikigraph_"
+
+
+class Histogram:
+    """
+    Counts the values observed in buckets, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets):
+        """
+        :param buckets: the sorted upper bounds of the buckets. A last bucket with no upper bound is added.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = None
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    def to_json(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.mean(), "max": self.max,
+                "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.counts)}}
+
+
+class Metrics:
+    """
+    The counters and the histograms of a run: how long every stage takes, how many requests and bytes were sent,
+    how many pages were found in the caches, and how long the chains are.
+    It is safe to update from many threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # name -> value
+        self.counters = {}
+        # (name, stage) -> Histogram. stage is None for histograms which are not of a stage.
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def count(self, name, value=1):
+        """
+        Adds to a counter.
+
+        :param name: the name of the counter, e.g "requests".
+        :param value: the value to add.
+        :return: None
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value, stage=None, buckets=SECONDS_BUCKETS):
+        """
+        Observes a value in a histogram.
+
+        :param name: the name of the histogram, e.g "chain_length".
+        :param value: the value observed.
+        :param stage: the stage the value belongs to, None - the histogram is not of a stage.
+        :param buckets: the buckets of the histogram, if it is new.
+        :return: None
+        """
+        with self.lock:
+            key = (name, stage)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def stage(self, stage):
+        """
+        Times a stage of the run, e.g:
+            with METRICS.stage("parse"):
+                ...
+
+        :param stage: the name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started_at = time.time()
+
+    def to_json(self):
+        """
+        :return: a dict of all the metrics, ready to be saved as json.
+        """
+        with self.lock:
+            stages = {stage: h.to_json() for (name, stage), h in self.histograms.items() if stage is not None}
+            return {"seconds": time.time() - self.started_at,
+                    "counters": dict(self.counters),
+                    "stages": stages,
+                    "histograms": {name: h.to_json() for (name, stage), h in self.histograms.items() if stage is None}}
+
+    def to_prometheus(self):
+        """
+        :return: all the metrics in the Prometheus text format.
+        """
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append("# TYPE " + PREFIX + name + "_total counter")
+                lines.append(PREFIX + name + "_total " + str(value))
+            types_written = set()
+            for (name, stage), h in sorted(self.histograms.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+                if name not in types_written:
+                    lines.append("# TYPE " + PREFIX + name + " histogram")
+                    types_written.add(name)
+                labels = "" if stage is None else 'stage="' + stage + '",'
+                cumulative = 0
+                for bound, count in zip(h.buckets + ("+Inf",), h.counts):
+                    cumulative += count
+                    lines.append(PREFIX + name + "_bucket{" + labels + 'le="' + str(bound) + '"} ' + str(cumulative))
+                labels = "" if stage is None else '{stage="' + stage + '"}'
+                lines.append(PREFIX + name + "_sum" + labels + " " + str(h.sum))
+                lines.append(PREFIX + name + "_count" + labels + " " + str(h.count))
+        return "\n".join(lines) + "\n"
+
+    def write(self, file_name):
+        """
+        Saves the metrics to file_name.json and file_name.prom.
+
+        :param file_name: the name of the files, without the extension.
+        :return: None
+        """
+        with open(file_name + ".json", "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+        with open(file_name + ".prom", "w") as f:
+            f.write(self.to_prometheus())
+
+    def report(self):
+        """
+        :return: lines summarizing where the time of the run went, and the counters.
+        """
+        summary = self.to_json()
+        lines = []
+        for stage, h in sorted(summary["stages"].items(), key=lambda item: -item[1]["sum"]):
+            lines.append("{}: {:.2f} seconds in {} calls ({:.1f} ms each, max {:.1f} ms)".format(
+                stage, h["sum"], h["count"], 1000 * h["mean"], 1000 * (h["max"] or 0)))
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(name + ": " + str(value))
+        for name, h in sorted(summary["histograms"].items()):
+            lines.append("{}: mean {:.2f}, max {}".format(name, h["mean"], h["max"]))
+        return lines
+
+
+class PeriodicReporter:
+    """
+    Saves the metrics every few seconds during a long run, so they can be watched (or scraped) while it runs.
+    """
+
+    def __init__(self, metrics, file_name, interval=60):
+        """
+        :param metrics: the Metrics to save.
+        :param file_name: the name of the files, without the extension (see Metrics.write()).
+        :param interval: the seconds between two saves.
+        """
+        self.metrics = metrics
+        self.file_name = file_name
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def __run(self):
+        while not self.stopped.wait(self.interval):
+            self.metrics.write(self.file_name)
+
+    def stop(self):
+        """
+        Stops saving the metrics, and saves them one last time.
+
+        :return: None
+        """
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.metrics.write(self.file_name)
+
+
+# the metrics of the run, shared by all the modules.
+METRICS = Metrics()
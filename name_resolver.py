@@ -0,0 +1,158 @@
+from WikiPage import WikiPage
+from link_cache import CACHE_FILE_NAME, BUSY_TIMEOUT_MS
+from metrics import METRICS
+# to search many names at the same time
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import threading
+import time
+
+# the default number of searches sent at the same time.
+DEFAULT_CONCURRENCY = 8
+# a name resolved is searched again after so many seconds (30 days), as the search results change over time.
+DEFAULT_TTL = 30 * 24 * 60 * 60
+# the maximum number of names kept in the cache. The names used least recently are dropped first.
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def query_key(query):
+    """
+    :return: the key of a search in the cache. The search ignores case and extra spaces, so does the key.
+        e.g: '  Formula   1 ' -> 'formula 1'
+    """
+    return " ".join(query.split()).lower()
+
+
+class NameCache:
+    """
+    A persistent on-disk cache of search -> the title it resolved to, kept next to the first links.
+    The entries expire after a TTL, and the cache keeps only the entries used most recently.
+    """
+
+    def __init__(self, file_name=CACHE_FILE_NAME, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :param file_name: the file the cache is saved in.
+        :param ttl: the seconds an entry is valid for.
+        :param max_entries: the maximum number of entries kept.
+        """
+        self.file_name = file_name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # the connection may be used from more than one thread, so we guard it with a lock.
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_name, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS resolved_names ("
+                                "query TEXT PRIMARY KEY, "
+                                "title TEXT, "
+                                "resolved_at REAL NOT NULL, "
+                                "used_at REAL NOT NULL)")
+        self.connection.commit()
+
+    def get_many(self, keys):
+        """
+        Gets the cached titles of many searches, and marks them as used.
+
+        :param keys: the keys of the searches (see query_key()).
+        :return: a dict of key -> the title (None - the search found no valid page), only for the keys cached.
+        """
+        now = time.time()
+        found = {}
+        with self.lock:
+            for key in keys:
+                row = self.connection.execute("SELECT title FROM resolved_names WHERE query = ? AND resolved_at > ?",
+                                              (key, now - self.ttl)).fetchone()
+                if row is not None:
+                    found[key] = row[0]
+            self.connection.executemany("UPDATE resolved_names SET used_at = ? WHERE query = ?",
+                                        [(now, key) for key in found])
+            self.connection.commit()
+        return found
+
+    def put_many(self, titles):
+        """
+        Saves the titles of many searches, and drops the entries used least recently if the cache is full.
+
+        :param titles: a dict of key -> the title (None - the search found no valid page).
+        :return: None
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO resolved_names VALUES (?, ?, ?, ?)",
+                                        [(key, title, now, now) for key, title in titles.items()])
+            self.connection.execute("DELETE FROM resolved_names WHERE query IN (SELECT query FROM resolved_names "
+                                    "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM resolved_names").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class NameResolver:
+    """
+    Resolves the names searched to Wikipedia page titles, many names at once:
+    the names not in the cache are searched concurrently, and the titles found are validated together
+    (following redirects, and dropping disambiguation pages) in batches, like WikiPage.validate_names().
+
+    e.g:
+    'lebron' -> 'LeBron James',
+    'ferari' -> 'Ferrari'
+    """
+
+    def __init__(self, cache=None, concurrency=DEFAULT_CONCURRENCY):
+        """
+        :param cache: the NameCache of the names resolved in previous runs. None - no caching.
+        :type cache: NameCache
+        :param concurrency: the maximum number of searches sent at the same time.
+        """
+        self.cache = cache
+        self.concurrency = concurrency
+
+    @staticmethod
+    def search(query):
+        """
+        Searches Wikipedia, like wikipedia.search(), but through WikiPage.session (so it is rate limited and retried).
+
+        :param query: the name searched.
+        :return: the title of the first result, None if nothing was found.
+        """
+        params = {"action": "query", "list": "search", "srsearch": query, "srlimit": 1, "srprop": "",
+                  "format": "json", "formatversion": 2}
+        with METRICS.stage("search"):
+            results = WikiPage.session.get(WikiPage.base_wiki_url + "w/api.php", params).json()
+        results = results.get("query", {}).get("search", [])
+        return results[0]["title"] if results else None
+
+    def resolve(self, queries):
+        """
+        Resolves many names searched.
+
+        :param queries: the names searched.
+        :return: a dict of name searched -> the title of the page (after following redirects).
+            None - if nothing was found, or the page found is a disambiguation page.
+        """
+        keys = {query: query_key(query) for query in queries}
+        resolved = {} if self.cache is None else self.cache.get_many(set(keys.values()))
+        METRICS.count("name_cache_hits", len(resolved))
+
+        # the first name searched of every key not cached.
+        missing = {}
+        for query, key in keys.items():
+            if key not in resolved:
+                missing.setdefault(key, query)
+        if missing:
+            METRICS.count("name_cache_misses", len(missing))
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                found = dict(zip(missing, executor.map(NameResolver.search, missing.values())))
+            valid_names = WikiPage.validate_names([title for title in found.values() if title is not None])
+            new_titles = {key: None if title is None else valid_names[title] for key, title in found.items()}
+            if self.cache is not None:
+                self.cache.put_many(new_titles)
+            resolved.update(new_titles)
+
+        return {query: resolved[key] for query, key in keys.items()}
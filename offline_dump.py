@@ -0,0 +1,318 @@
+from link_extractor import FirstLinkExtractor
+from link_rules import LinkRules
+from collections import namedtuple
+# to read the compressed dumps
+import bz2
+import gzip
+import json
+import tarfile
+import xml.etree.ElementTree as ElementTree
+# to parse the pages in parallel
+from multiprocessing import Pool
+from urllib.parse import unquote
+import re
+import sys
+
+# the number of pages sent together to a worker process.
+BATCH_SIZE = 200
+
+# a page read from a dump.
+# body - the wikitext of the page (XML dumps) or its html (HTML dumps).
+# is_html - True if body is html.
+# redirect - the title the page redirects to, None if the page is not a redirect.
+DumpPage = namedtuple("DumpPage", ["title", "revid", "body", "is_html", "redirect"])
+
+# a row of the first links table: the page, the title of the page its first link leads to (None - no valid link),
+# the revision the link was computed from, and if the page is a redirect (the first link is the redirect target).
+FirstLinkRow = namedtuple("FirstLinkRow", ["title", "first_link", "revid", "is_redirect"])
+
+COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+REF_PATTERN = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+# side-comments in wikitext, like in html: smaller text or supper text.
+SIDE_COMMENT_PATTERN = re.compile(r"<(small|sup)[^>]*>.*?</\1>", re.DOTALL | re.IGNORECASE)
+# a link to another wiki, or another language: [[wikt:word]], [[fr:Mot]].
+INTERWIKI_PATTERN = re.compile(r"^:?[a-z][a-z-]*:")
+# the first characters of a line starting a new block of text, like BLOCK_TAGS in html:
+# an empty line (a new paragraph), a list item ('*', '#'), an indented or a definition line (':', ';') or a heading.
+BLOCK_STARTS = "\n*#:;="
+
+
+class WikitextLink:
+    """
+    A link found in wikitext, checked by LinkRules like a link in html.
+    Its parent tag is the innermost formatting it is in ('i' - italic, 'b' - bold), like the tag MediaWiki renders it
+    in.
+    Wikitext links have no classes, and no parents with classes or ids.
+    """
+
+    __slots__ = ("url", "link_class", "parent_tag", "in_brackets", "text_is_or")
+
+    def __init__(self, target, text, parent_tag=None, in_brackets=False):
+        self.url = "/wiki/" + target.strip().replace(" ", "_")
+        self.link_class = ""
+        self.parent_tag = parent_tag
+        self.in_brackets = in_brackets
+        self.text_is_or = text.strip() == "or"
+
+    @staticmethod
+    def ancestors():
+        return [], []
+
+
+def skip_nested(text, i, opening, closing):
+    """
+    :return: the index right after the closing of the nested structure opened at index i, like {{...{{...}}...}}.
+    """
+    depth = 0
+    while i < len(text):
+        if text.startswith(opening, i):
+            depth += 1
+            i += len(opening)
+        elif text.startswith(closing, i):
+            depth -= 1
+            i += len(closing)
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    return i
+
+
+def title_of(target):
+    """
+    :return: the title of a page as a link refers to it: 'formula_one' -> 'Formula one'.
+    """
+    target = unquote(target).replace("_", " ").strip()
+    return target[:1].upper() + target[1:]
+
+
+def toggle_formatting(formatting, tag):
+    if tag in formatting:
+        formatting.remove(tag)
+    else:
+        formatting.append(tag)
+
+
+def first_link_in_wikitext(text, rules):
+    """
+    Finds the first valid link in the wikitext of a page.
+    The links are checked with the same LinkRules as the links in html: the brackets they are in and the formatting
+    around them are found like in the html rendered (the brackets are counted in each block of text), and passed to
+    the rules. References and side-comments are removed, like the side-comments in html.
+
+    Where it may choose another link than the online crawl (see tests/test_offline_dump.py):
+    - templates are skipped, so a link rendered by a template (like {{lang|fr|[[Mot]]}}) is never chosen,
+      though the online crawl chooses it if it isn't in a box (like an infobox or a hatnote).
+    - tables are skipped, though online only the links in boxes (like infoboxes and navboxes) are skipped.
+
+    :param text: the wikitext of the page.
+    :param rules: the rules of a valid link.
+    :type rules: LinkRules
+    :return: the title of the page the first valid link leads to, None if there is no valid link.
+    """
+    text = COMMENT_PATTERN.sub("", text)
+    text = REF_PATTERN.sub("", text)
+    text = SIDE_COMMENT_PATTERN.sub("", text)
+
+    i = 0
+    bracket_depth = 0
+    # the formatting open, the innermost last: 'i' - italic, 'b' - bold.
+    formatting = []
+    while i < len(text):
+        if text.startswith("{{", i):
+            i = skip_nested(text, i, "{{", "}}")
+        elif text.startswith("{|", i):
+            i = skip_nested(text, i, "{|", "|}")
+        elif text.startswith("[[", i):
+            end = skip_nested(text, i, "[[", "]]")
+            target, _, link_text = text[i + 2:end - 2].partition("|")
+            if not INTERWIKI_PATTERN.match(target.strip()):
+                link = WikitextLink(target, link_text or target, formatting[-1] if formatting else None,
+                                    bracket_depth > 0)
+                if rules.is_valid(link):
+                    return title_of(target)
+            i = end
+        elif text.startswith("'''", i) and not text.startswith("''''", i):
+            toggle_formatting(formatting, "b")
+            i += 3
+        elif text.startswith("''", i):
+            toggle_formatting(formatting, "i")
+            i += 2
+        else:
+            if text[i] == "(":
+                bracket_depth += 1
+            elif text[i] == ")" and bracket_depth > 0:
+                bracket_depth -= 1
+            elif text[i] == "\n":
+                # the formatting never continues to the next line
+                formatting = []
+                # a block of text starts with no brackets open, and the brackets left open in it end with it.
+                if i + 1 < len(text) and text[i + 1] in BLOCK_STARTS:
+                    bracket_depth = 0
+            i += 1
+    return None
+
+
+def first_link_in_html(html, rules):
+    """
+    Finds the first valid link in the html of a page from an HTML dump.
+
+    :param html: the html of the page.
+    :param rules: the rules of a valid link.
+    :type rules: LinkRules
+    :return: the title of the page the first valid link leads to, None if there is no valid link.
+    """
+    # the HTML dumps link to pages relatively: <a href="./Philosophy">.
+    html = html.replace('href="./', 'href="/wiki/')
+    first_link = FirstLinkExtractor(rules).find_first_link(html)
+    if first_link is None:
+        return None
+    return title_of(first_link.replace("/wiki/", "", 1))
+
+
+def first_links_of_batch(batch):
+    """
+    Finds the first links of a batch of pages. Runs in a worker process.
+
+    :param batch: a list of DumpPage pages.
+    :return: a list of FirstLinkRow rows.
+    """
+    rules = LinkRules()
+    rows = []
+    for page in batch:
+        if page.redirect is not None:
+            rows.append(FirstLinkRow(page.title, title_of(page.redirect), page.revid, True))
+        elif page.is_html:
+            rows.append(FirstLinkRow(page.title, first_link_in_html(page.body, rules), page.revid, False))
+        else:
+            rows.append(FirstLinkRow(page.title, first_link_in_wikitext(page.body, rules), page.revid, False))
+    return rows
+
+
+def open_compressed(file_name, mode="rb"):
+    """
+    Opens a file, decompressing it on the fly according to its extension (.bz2 or .gz).
+    """
+    if file_name.endswith(".bz2"):
+        return bz2.open(file_name, mode)
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, mode)
+    return open(file_name, mode)
+
+
+def read_xml_dump(file_name):
+    """
+    Streams the articles of a MediaWiki XML dump (pages-articles.xml, optionally compressed).
+
+    :param file_name: the name of the dump file.
+    :return: a generator of DumpPage pages.
+    """
+    with open_compressed(file_name) as f:
+        page = {}
+        in_revision = False
+        root = None
+        for event, element in ElementTree.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = element
+            # the tags come with the namespace of the dump: {http://www.mediawiki.org/xml/export-0.10/}page
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "revision":
+                in_revision = event == "start"
+            if event == "start":
+                continue
+
+            if tag == "title":
+                page["title"] = element.text
+            elif tag == "ns":
+                page["ns"] = element.text
+            elif tag == "redirect":
+                page["redirect"] = element.get("title")
+            # the first <id> in the revision is the revision id (the <id> before it is the page id).
+            elif tag == "id" and in_revision and "revid" not in page:
+                page["revid"] = int(element.text)
+            elif tag == "text":
+                page["text"] = element.text or ""
+            elif tag == "page":
+                if page.get("ns") == "0":
+                    yield DumpPage(page["title"], page.get("revid"), page.get("text", ""), False,
+                                   page.get("redirect"))
+                page = {}
+                # we don't keep the pages read in memory.
+                root.clear()
+
+
+def read_html_dump(file_name):
+    """
+    Streams the articles of a Wikimedia Enterprise HTML dump: a .tar.gz of ndjson files, or a single ndjson file
+    (optionally compressed). Each line is an article with its name, version and "article_body": {"html": ...}.
+
+    :param file_name: the name of the dump file.
+    :return: a generator of DumpPage pages.
+    """
+    if ".tar" in file_name:
+        with tarfile.open(file_name, "r:*") as tar:
+            for member in tar:
+                if member.isfile():
+                    yield from read_ndjson_lines(tar.extractfile(member))
+    else:
+        with open_compressed(file_name) as f:
+            yield from read_ndjson_lines(f)
+
+
+def read_ndjson_lines(f):
+    for line in f:
+        if not line.strip():
+            continue
+        article = json.loads(line)
+        if article.get("namespace", {}).get("identifier", 0) != 0:
+            continue
+        yield DumpPage(article["name"], article.get("version", {}).get("identifier"),
+                       article.get("article_body", {}).get("html", ""), True, None)
+
+
+def read_dump(file_name):
+    """
+    :return: a generator of the DumpPage pages of an XML or an HTML dump, according to the file name.
+    """
+    if ".xml" in file_name:
+        return read_xml_dump(file_name)
+    return read_html_dump(file_name)
+
+
+def batches_of(pages, batch_size=BATCH_SIZE):
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_first_links_table(dump_file_name, table_file_name, processes=None):
+    """
+    Computes the first link of every article in a dump, and writes the table:
+    title <tab> first link title <tab> revision id <tab> 1 if the page is a redirect, 0 otherwise.
+
+    :param dump_file_name: the name of the dump file (XML or HTML dump).
+    :param table_file_name: the name of the table file to write (.tsv, optionally .gz or .bz2).
+    :param processes: the number of worker processes. None - the number of CPUs.
+    :return: the number of pages written.
+    """
+    num_of_pages = 0
+    with Pool(processes) as pool, open_compressed(table_file_name, "wt") as table:
+        for rows in pool.imap(first_links_of_batch, batches_of(read_dump(dump_file_name))):
+            for row in rows:
+                table.write("\t".join([row.title, row.first_link or "", str(row.revid or ""),
+                                       str(int(row.is_redirect))]) + "\n")
+            num_of_pages += len(rows)
+            if num_of_pages % (BATCH_SIZE * 100) < len(rows):
+                print("wrote", num_of_pages, "pages")
+    return num_of_pages
+
+
+if __name__ == '__main__':
+    # python offline_dump.py enwiki-latest-pages-articles.xml.bz2 first_links.tsv.gz [processes]
+    print("wrote", write_first_links_table(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None),
+          "pages")
@@ -0,0 +1,157 @@
+from WikiPage import WikiPage
+from graph_analysis import FirstLinkGraph, GraphAnalysis, NO_SUCCESSOR
+# to keep the jump tables
+import numpy as np
+import sys
+
+
+class PathIndex:
+    """
+    A jump table index over the first links graph: for every page, its 2^k-th successor for every k.
+    Any hop of a chain, the whole chain, or the page where the chains of two pages meet,
+    is found in O(log n) array lookups, without fetching anything.
+    """
+
+    def __init__(self, graph, skip_redirects=True):
+        """
+        :param graph: the FirstLinkGraph to index.
+        :param skip_redirects: True - a link to a redirect leads straight to the redirect target.
+        """
+        self.graph = graph
+        self.analysis = GraphAnalysis(graph, skip_redirects=skip_redirects)
+        n = len(graph)
+        successors = self.analysis.successors
+        ids = np.arange(n, dtype=np.int32)
+        # dead ends point to themselves, so jumping past them stays there.
+        self.jump = np.where(successors == NO_SUCCESSOR, ids, successors).astype(np.int32)
+
+        # the length of the loop each chain gets to (0 - a dead end).
+        loop_sizes = np.bincount(self.analysis.drains_into[self.analysis.on_cycle], minlength=n)
+        self.loop_length = np.where(self.analysis.drains_into >= 0,
+                                    loop_sizes[np.maximum(self.analysis.drains_into, 0)], 0)
+        # the longest chain (until a page repeats) is depth + loop length, so we need jumps up to that long.
+        longest_chain = int((self.analysis.depth + self.loop_length).max()) if n else 0
+        self.up = [self.jump]
+        for _ in range(max(1, longest_chain.bit_length()) - 1):
+            self.up.append(self.up[-1][self.up[-1]])
+
+    @staticmethod
+    def from_table(file_name):
+        return PathIndex(FirstLinkGraph.from_table(file_name))
+
+    @staticmethod
+    def from_memo(memo):
+        return PathIndex(FirstLinkGraph.from_memo(memo))
+
+    def __contains__(self, title):
+        return title in self.graph.ids
+
+    def __kth_id(self, node, k):
+        """
+        :return: the id reached after k hops from node. k must be shorter than 2^len(self.up).
+        """
+        for up in self.up:
+            if k == 0:
+                break
+            if k & 1:
+                node = up[node]
+            k >>= 1
+        return int(node)
+
+    def __reduce_hops(self, node, k):
+        """
+        :return: the number of hops leading to the same page as k hops, at most depth + loop length.
+        """
+        depth = int(self.analysis.depth[node])
+        loop_length = int(self.loop_length[node])
+        if k <= depth or loop_length == 0:
+            return k
+        return depth + (k - depth) % loop_length
+
+    def kth(self, title, k):
+        """
+        :param title: the page to start from.
+        :param k: the number of clicks.
+        :return: the title of the page reached after k clicks, None if the chain ends (a dead end) before that.
+        """
+        node = self.graph.ids[title]
+        if self.loop_length[node] == 0 and k > self.analysis.depth[node]:
+            return None
+        return self.graph.titles[self.__kth_id(node, self.__reduce_hops(node, k))]
+
+    def chain(self, title):
+        """
+        :param title: the page to start from.
+        :return: the titles of the pages in the chain, until reaching Philosophy, a dead end
+            or the first page repeating.
+        """
+        node = self.graph.ids[title]
+        if self.analysis.distance_to_target[node] >= 0:
+            # we stop at Philosophy
+            length = int(self.analysis.distance_to_target[node])
+        else:
+            length = int(self.analysis.depth[node] + self.loop_length[node])
+        chain = [node]
+        for _ in range(length):
+            chain.append(int(self.jump[chain[-1]]))
+        return [self.graph.titles[i] for i in chain]
+
+    def meeting_point(self, title1, title2):
+        """
+        Finds the first page on the chain of title1 which is also on the chain of title2.
+
+        :return: the title of the page, None if the chains never meet.
+        """
+        a = self.graph.ids[title1]
+        b = self.graph.ids[title2]
+        depth = self.analysis.depth
+        # the page each chain gets onto its loop (or its dead end) at.
+        root_a = self.__kth_id(a, int(depth[a]))
+        root_b = self.__kth_id(b, int(depth[b]))
+        if root_a != root_b:
+            # the chains get onto the same loop at different pages, so they meet when the first chain gets onto it.
+            loop_a = self.analysis.drains_into[a]
+            same_loop = loop_a >= 0 and loop_a == self.analysis.drains_into[b]
+            return self.graph.titles[root_a] if same_loop else None
+
+        # both chains get to the same root, so they are on the same tree: we find their lowest common ancestor.
+        if depth[a] > depth[b]:
+            a = self.__kth_id(a, int(depth[a] - depth[b]))
+        else:
+            b = self.__kth_id(b, int(depth[b] - depth[a]))
+        if a == b:
+            return self.graph.titles[a]
+        for up in reversed(self.up):
+            if up[a] != up[b]:
+                a = int(up[a])
+                b = int(up[b])
+        return self.graph.titles[int(self.jump[a])]
+
+    def fill_memo(self, memo, title, debug=False):
+        """
+        Records the chain of a page in a ChainMemo, so drawing it with draw_page_path() doesn't fetch anything.
+
+        :param memo: the ChainMemo to fill.
+        :type memo: ChainMemo
+        :param title: the page to start from.
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        :return: the first WikiPage of the chain.
+        """
+        chain = self.chain(title)
+        pages = {}
+        for name in chain:
+            if name not in pages:
+                pages[name] = WikiPage.from_name(name, debug)
+        for name, next_name in zip(chain, chain[1:]):
+            memo.record(pages[name].name, pages[next_name])
+        if self.analysis.is_dead_end[self.graph.ids[chain[-1]]]:
+            memo.record(pages[chain[-1]].name, None)
+        return pages[chain[0]]
+
+
+if __name__ == '__main__':
+    # python path_index.py first_links.tsv.gz Banana
+    index = PathIndex.from_table(sys.argv[1])
+    print(" -> ".join(index.chain(" ".join(sys.argv[2:]))))
@@ -0,0 +1,132 @@
+from graph_analysis import FirstLinkGraph, GraphAnalysis, reverse_edges
+# to keep the index in arrays, and memory-map them from disk
+import numpy as np
+import os
+import sys
+
+OFFSETS_FILE_NAME = "offsets.npy"
+PREDECESSORS_FILE_NAME = "predecessors.npy"
+IN_TREE_SIZES_FILE_NAME = "in_tree_sizes.npy"
+TITLES_FILE_NAME = "titles.txt"
+
+
+class PredecessorIndex:
+    """
+    An inverted index of the first links graph: for every page, the pages whose first link leads to it.
+    The index is kept CSR style - the predecessors of page i are predecessors[offsets[i]:offsets[i + 1]],
+    so it can be saved to disk and memory-mapped back.
+    """
+
+    def __init__(self, titles, offsets, predecessors, in_tree_sizes):
+        """
+        :param titles: the list of titles, the title of id i is titles[i].
+        :param offsets: the start of the predecessors of every id in predecessors (and the end, at the last place).
+        :param predecessors: the ids of the predecessors of all the pages, grouped by page.
+        :param in_tree_sizes: the number of pages whose chain passes through each page (including itself).
+        """
+        self.titles = titles
+        self.ids = {title: i for i, title in enumerate(titles)}
+        self.offsets = offsets
+        self.predecessors = predecessors
+        self.in_tree_sizes = in_tree_sizes
+
+    @staticmethod
+    def from_graph(graph, skip_redirects=True):
+        """
+        Builds the index from the first links graph, in a single pass over the successors.
+
+        :param graph: the FirstLinkGraph.
+        :param skip_redirects: True - a link to a redirect leads straight to the redirect target.
+        :return: the PredecessorIndex.
+        """
+        analysis = GraphAnalysis(graph, skip_redirects=skip_redirects)
+        offsets, predecessors = reverse_edges(analysis.successors)
+        return PredecessorIndex(graph.titles, offsets, predecessors, analysis.in_tree_size)
+
+    @staticmethod
+    def from_table(file_name):
+        return PredecessorIndex.from_graph(FirstLinkGraph.from_table(file_name))
+
+    @staticmethod
+    def from_memo(memo):
+        return PredecessorIndex.from_graph(FirstLinkGraph.from_memo(memo))
+
+    def save(self, directory):
+        """
+        Saves the index to a directory, so it can be loaded (memory-mapped) without building it again.
+
+        :param directory: the directory to save the index in.
+        :return: None
+        """
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+        np.save(os.path.join(directory, OFFSETS_FILE_NAME), self.offsets)
+        np.save(os.path.join(directory, PREDECESSORS_FILE_NAME), self.predecessors)
+        np.save(os.path.join(directory, IN_TREE_SIZES_FILE_NAME), self.in_tree_sizes)
+        with open(os.path.join(directory, TITLES_FILE_NAME), "w", encoding="utf-8") as f:
+            for title in self.titles:
+                f.write(title + "\n")
+
+    @staticmethod
+    def load(directory, mmap=True):
+        """
+        Loads an index saved with save().
+
+        :param directory: the directory the index is saved in.
+        :param mmap: True - memory-map the arrays instead of reading them into memory.
+        :return: the PredecessorIndex.
+        """
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(directory, TITLES_FILE_NAME), encoding="utf-8") as f:
+            titles = f.read().split("\n")[:-1]
+        return PredecessorIndex(titles,
+                                np.load(os.path.join(directory, OFFSETS_FILE_NAME), mmap_mode=mmap_mode),
+                                np.load(os.path.join(directory, PREDECESSORS_FILE_NAME), mmap_mode=mmap_mode),
+                                np.load(os.path.join(directory, IN_TREE_SIZES_FILE_NAME), mmap_mode=mmap_mode))
+
+    def __contains__(self, title):
+        return title in self.ids
+
+    def predecessors_of(self, title):
+        """
+        :return: the titles of the pages whose first link leads to the page.
+        """
+        i = self.ids[title]
+        return [self.titles[p] for p in self.predecessors[self.offsets[i]:self.offsets[i + 1]]]
+
+    def in_tree(self, title, max_depth=None, top_k=None):
+        """
+        Extracts everything that flows through a page: all the pages whose chain passes through it.
+
+        :param title: the page.
+        :param max_depth: the maximum number of clicks from a page to the page given. None - no limit.
+        :param top_k: keep only the k predecessors with the biggest in-trees of every page. None - keep all.
+        :return: the list of the edges of the in-tree: (page title, the title its first link leads to).
+        """
+        root = self.ids[title]
+        visited = {root}
+        frontier = [root]
+        edges = []
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for page in frontier:
+                predecessors = self.predecessors[self.offsets[page]:self.offsets[page + 1]]
+                if top_k is not None and len(predecessors) > top_k:
+                    biggest = np.argsort(self.in_tree_sizes[predecessors], kind="stable")[::-1][:top_k]
+                    predecessors = predecessors[biggest]
+                for predecessor in predecessors:
+                    predecessor = int(predecessor)
+                    edges.append((self.titles[predecessor], self.titles[page]))
+                    # a page on a loop with the root leads back to it
+                    if predecessor not in visited:
+                        visited.add(predecessor)
+                        next_frontier.append(predecessor)
+            frontier = next_frontier
+        return edges
+
+
+if __name__ == '__main__':
+    # python predecessor_index.py first_links.tsv.gz index_directory
+    PredecessorIndex.from_table(sys.argv[1]).save(sys.argv[2])
@@ -0,0 +1,68 @@
+from WikiPage import WikiPage
+from link_cache import LinkCache, CACHE_FILE_NAME
+import contextlib
+import sys
+
+
+def changed_pages(cache):
+    """
+    Finds the cached pages which were edited since their first link was computed.
+    Only the revision ids are requested (50 pages a request), the pages themselves are not fetched.
+
+    :param cache: the LinkCache to check.
+    :type cache: LinkCache
+    :return: a dict of the name of every page which changed -> the titles cached for it
+        (the page itself, and the redirects to it).
+    """
+    # several titles (redirects) may be cached for the same page, so we check every page once.
+    titles_of = {}
+    cached_revid = {}
+    for title, cached in cache.entries():
+        titles_of.setdefault(cached.name, []).append(title)
+        cached_revid[cached.name] = cached.revid
+
+    latest = WikiPage.latest_revisions(list(titles_of))
+    return {name: titles_of[name] for name in titles_of if latest[name] != cached_revid[name]}
+
+
+def refresh_cache(cache, memo=None, debug=False, lock=None):
+    """
+    Computes again the first links of the cached pages which were edited, and updates the cache.
+    The cost is proportional to the number of pages edited, not to the size of the cache.
+
+    :param cache: the LinkCache to refresh.
+    :type cache: LinkCache
+    :param memo: a ChainMemo to invalidate the chains passing through the pages which changed in. None - no memo.
+    :type memo: ChainMemo
+    :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+    :type debug: bool
+    :param lock: the lock guarding the memo, held only while invalidating it (the pages are fetched outside of it).
+        None - the memo isn't shared.
+    :return: the names of the pages which changed.
+    """
+    changed = changed_pages(cache)
+    for name, titles in changed.items():
+        page = WikiPage.from_name(name, debug)
+        first_link = page.get_first_link(use_cache=False)
+        page.html = None
+        if debug:
+            print("refreshed", name, "->", first_link)
+        # the redirects to the page lead to the same first link.
+        for title in titles:
+            cache.put(title, first_link, page.name, page.revid)
+
+    if memo is not None:
+        with contextlib.nullcontext() if lock is None else lock:
+            memo.invalidate([title for titles in changed.values() for title in titles])
+    return list(changed)
+
+
+if __name__ == '__main__':
+    # python refresh.py [first_links.sqlite]
+    link_cache = LinkCache(sys.argv[1] if len(sys.argv) > 1 else CACHE_FILE_NAME)
+    WikiPage.cache = link_cache
+    num_of_pages = len(link_cache)
+    changed_names = refresh_cache(link_cache)
+    print("checked", num_of_pages, "pages,", len(changed_names), "of them changed")
+    link_cache.close()
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+
+# the default file the journal of a run is written to.
+JOURNAL_FILE_NAME = "run_journal.jsonl"
+
+# the journal is forced to the disk (fsync) every so many records, or every so many seconds - the first of them.
+FSYNC_EVERY = 50
+FSYNC_SECONDS = 5
+
+
+class RunJournal:
+    """
+    An append only journal of a run, so a run which crashed (or was stopped) can be resumed where it stopped.
+    Every line is a json record:
+        {"starts": [...]} - the names of the first pages of a graph, written before drawing it.
+        {"chain": [...], "dead_end": true/false} - the names of the pages of a chain walked,
+            and if its last page has no valid link.
+
+    The lines are flushed right away, and forced to the disk in batches.
+    When a journal is continued, the graphs started in it are drawn again first, so their starts are not written twice.
+    A chain is written only if it has a link not in the journal yet, so the chains replayed are not written again.
+    """
+
+    def __init__(self, file_name=JOURNAL_FILE_NAME, append=False):
+        """
+        :param file_name: the file of the journal.
+        :param append: True - continue an existing journal. False - start a new one.
+        """
+        self.file_name = file_name
+        # the number of graphs already started in the journal, which are drawn again before any new graph.
+        self.starts_to_skip = 0
+        # the links of all the chains in the journal: (name, the name its first link leads to, None - a dead end).
+        self.links = set()
+        if append and os.path.exists(file_name):
+            starts, chains = RunJournal.load(file_name)
+            self.starts_to_skip = len(starts)
+            for names, dead_end in chains:
+                self.links |= RunJournal.links_of(names, dead_end)
+        self.file = open(file_name, "a" if append else "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def __write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            self.pending += 1
+            if self.pending >= FSYNC_EVERY or time.monotonic() - self.last_sync >= FSYNC_SECONDS:
+                self.__sync()
+
+    def __sync(self):
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def starts(self, names):
+        """
+        Records the first pages of a graph, before drawing it.
+
+        :param names: the names of the first pages.
+        :return: None
+        """
+        if self.starts_to_skip > 0:
+            self.starts_to_skip -= 1
+            return
+        self.__write({"starts": list(names)})
+
+    def chain(self, names, dead_end):
+        """
+        Records a chain walked.
+
+        :param names: the names of the pages in the chain, in order.
+        :param dead_end: True - the last page has no valid link.
+        :return: None
+        """
+        names = list(names)
+        links = RunJournal.links_of(names, dead_end)
+        with self.lock:
+            if links <= self.links:
+                return
+            self.links |= links
+        self.__write({"chain": names, "dead_end": dead_end})
+
+    @staticmethod
+    def links_of(names, dead_end):
+        """
+        :return: the set of links of a chain: (name, the name its first link leads to, None - a dead end).
+        """
+        links = set(zip(names, names[1:]))
+        if dead_end:
+            links.add((names[-1], None))
+        return links
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.__sync()
+                self.file.close()
+
+    @staticmethod
+    def load(file_name=JOURNAL_FILE_NAME):
+        """
+        Reads a journal. A last line cut in the middle (the run crashed while writing it) is skipped.
+
+        :param file_name: the file of the journal.
+        :return: (a list of the first pages of every graph started, a list of (chain names, dead end) of every chain).
+        """
+        starts = []
+        chains = []
+        with open(file_name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if "starts" in record:
+                    starts.append(record["starts"])
+                elif "chain" in record:
+                    chains.append((record["chain"], record["dead_end"]))
+        return starts, chains
+
+
+def replay_chains(chains, memo):
+    """
+    Records the chains of a journal in a ChainMemo, so drawing them again doesn't fetch anything.
+
+    :param chains: a list of (chain names, dead end), like the one returned by RunJournal.load().
+    :param memo: the ChainMemo to fill.
+    :type memo: ChainMemo
+    :return: None
+    """
+    for names, dead_end in chains:
+        for name, next_name in zip(names, names[1:]):
+            memo.set_successor(name, next_name)
+        if dead_end:
+            memo.set_successor(names[-1], None)
@@ -0,0 +1,191 @@
+from WikiPage import WikiPage
+from chain_memo import ChainMemo, PHILOSOPHY
+from link_cache import LinkCache, CACHE_FILE_NAME
+from metrics import METRICS
+from transport import WikiSession
+# to walk the chains on all the cores
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import tempfile
+import os
+import time
+
+# the default number of worker processes.
+DEFAULT_PROCESSES = os.cpu_count() or 1
+# the number of first pages sent to a worker at a time. Small enough to keep all the workers busy until the end.
+CHUNK_SIZE = 8
+# a worker reaching a page another worker is fetching waits for it to be cached, polling every so many seconds,
+# and fetches the page itself if it isn't cached after CLAIM_TIMEOUT seconds.
+CLAIM_POLL_SECONDS = 0.05
+CLAIM_TIMEOUT = 30
+
+
+class ShardedCrawler:
+    """
+    Walks the chains of many pages in a few worker processes, so parsing the pages uses all the cores.
+
+    The first pages are split into chunks, and every worker walks the chains of a chunk at a time.
+    The workers share the pages they resolved through the LinkCache (in WAL mode): a page cached by one worker
+    is not fetched or parsed again by the others, and a page being fetched is claimed, so a worker reaching it
+    waits for it instead of fetching it too.
+
+    Like the AsyncCrawler, the crawler only fills the memo with the chains the workers walked.
+    Drawing the pages afterwards with draw_page_path() and the same memo doesn't fetch anything,
+    so the graph drawn is the same as the one drawn one page at a time.
+    """
+
+    def __init__(self, memo, processes=DEFAULT_PROCESSES, debug=False, journal=None):
+        """
+        :param memo: the ChainMemo to fill.
+        :type memo: ChainMemo
+        :param processes: the number of worker processes.
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        :param journal: the RunJournal every chain walked is written to. None - no journal.
+        :type journal: RunJournal
+        """
+        self.memo = memo
+        self.processes = processes
+        self.debug = debug
+        self.journal = journal
+
+    def crawl(self, pages):
+        """
+        Walks the chains of all the pages, until each of them reaches "Philosophy", a loop, a dead end,
+        or a page the worker already walked through.
+
+        :param pages: the WikiPage pages to start from.
+        :return: None
+        """
+        names = list(dict.fromkeys(page.name for page in pages if page.name not in self.memo))
+        if not names:
+            return
+        chunks = [names[i:i + CHUNK_SIZE] for i in range(0, len(names), CHUNK_SIZE)]
+
+        # without a cache to share, the workers share a temporary one.
+        temporary_directory = None
+        if WikiPage.cache is not None:
+            cache_file_name = WikiPage.cache.file_name
+            WikiPage.cache.clear_claims()
+        else:
+            temporary_directory = tempfile.TemporaryDirectory()
+            cache_file_name = os.path.join(temporary_directory.name, CACHE_FILE_NAME)
+            LinkCache(cache_file_name).close()
+
+        # the workers share the rate limit, so all of them together don't send more requests than a single process.
+        rate_limiter = WikiPage.session.rate_limiter
+        requests_per_second = None if rate_limiter is None else rate_limiter.rate / self.processes
+        settings = (cache_file_name, requests_per_second, WikiPage.base_wiki_url,
+                    WikiPage.streaming_parser, WikiPage.lead_section_first)
+        # the workers are spawned, not forked: a forked worker would inherit the connection to the cache, and locks
+        # (like the lock of METRICS) held by other threads at the moment of the fork.
+        spawn = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(self.processes, mp_context=spawn, initializer=init_worker,
+                                     initargs=settings) as executor:
+                futures = [executor.submit(crawl_chunk, chunk, self.debug) for chunk in chunks]
+                for future in as_completed(futures):
+                    self.merge(*future.result())
+        finally:
+            if temporary_directory is not None:
+                temporary_directory.cleanup()
+
+    def merge(self, pairs, chains, counters):
+        """
+        Records the results of a chunk in the memo.
+
+        :param pairs: a list of (title, the title its first link leads to) of the pages the worker visited.
+        :param chains: a list of (chain names, dead end) of the chains the worker walked.
+        :param counters: the metrics counters of the worker.
+        :return: None
+        """
+        for name, next_name in pairs:
+            self.memo.set_successor(name, next_name)
+        if self.journal is not None:
+            for names, dead_end in chains:
+                self.journal.chain(names, dead_end)
+        for name, value in counters.items():
+            METRICS.count(name, value)
+
+
+def init_worker(cache_file_name, requests_per_second, base_wiki_url, streaming_parser, lead_section_first):
+    """
+    Sets up a worker process: its own connection to the shared cache, and its own HTTP session.
+    The workers are spawned, so they start with the defaults of WikiPage, and its settings are passed explicitly.
+    """
+    WikiPage.cache = LinkCache(cache_file_name)
+    WikiPage.session = WikiSession(requests_per_second)
+    WikiPage.base_wiki_url = base_wiki_url
+    WikiPage.streaming_parser = streaming_parser
+    WikiPage.lead_section_first = lead_section_first
+
+
+def fetch_claimed(page, debug=False):
+    """
+    Fetches the next page in the chain of page, unless another worker is fetching it right now.
+    Then we wait for it to be cached, and take it from the cache.
+
+    :param page: the WikiPage page.
+    :type page: WikiPage page
+    :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+    :type debug: bool
+    :return: the next WikiPage in the chain, or None if the page has no valid link.
+    """
+    cache = WikiPage.cache
+    name = page.name
+    deadline = time.monotonic() + CLAIM_TIMEOUT
+    while name not in cache and time.monotonic() < deadline:
+        if cache.claim(name):
+            # if the page was cached right before we claimed it, it is taken from the cache anyway.
+            try:
+                return ChainMemo.fetch_next_page(page, debug)
+            finally:
+                cache.release(name)
+        METRICS.count("claim_waits")
+        time.sleep(CLAIM_POLL_SECONDS)
+    return ChainMemo.fetch_next_page(page, debug)
+
+
+def crawl_chunk(names, debug=False):
+    """
+    Walks the chains of a chunk of first pages. Runs in a worker process.
+
+    :param names: the names of the first pages.
+    :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+    :type debug: bool
+    :return: (a list of (title, the title its first link leads to) of the pages visited,
+        a list of (chain names, dead end) of the chains walked, the metrics counters of the chunk).
+    """
+    METRICS.reset()
+    memo = ChainMemo()
+    chains = []
+    for name in names:
+        page = WikiPage.from_name(name, debug)
+        road_of_page = [page.name]
+        pages_on_road = {page.name}
+        count_pages = 0
+        dead_end = False
+        while page.name != PHILOSOPHY and count_pages <= 100:
+            name_before = page.name
+            try:
+                next_page = fetch_claimed(page, debug)
+            except Exception as e:
+                # drawing the page afterwards will try fetching it again.
+                print("Failed fetching", page.name, ":", e)
+                break
+            memo.record_visit(name_before, page, next_page)
+            count_pages += 1
+            if next_page is None:
+                dead_end = True
+                break
+            road_of_page.append(next_page.name)
+            # if we reached a loop, or a page this worker already walked through.
+            if next_page.name in pages_on_road or next_page.name in memo:
+                break
+            pages_on_road.add(next_page.name)
+            page = next_page
+        chains.append((road_of_page, dead_end))
+    return list(memo.store.pairs()), chains, METRICS.to_json()["counters"]
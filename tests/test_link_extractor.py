@@ -0,0 +1,88 @@
+import link_extractor
+from link_extractor import FirstLinkExtractor, compare_with_soup
+from WikiPage import WikiPage
+import pytest
+import glob
+import os
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# lead_sections - the lead sections of real pages, saved from the English Wikipedia (CC BY-SA).
+# link_cases - small hand-written lead sections, each checking a rule of a valid first link.
+FOLDERS = ["lead_sections", "link_cases"]
+
+# the saved html -> the first link the original parser picks in it (the BeautifulSoup parser of the first version,
+# finding the brackets with regular expressions over the parent of the parent of the link). None - no valid link.
+BASELINE_FIRST_LINKS = {
+    "lead_sections/antivirus_software.html": "/wiki/Computer_program",
+    "lead_sections/bush.html": "/wiki/Bush_(plant)",
+    "lead_sections/celtuce.html": "/wiki/Lettuce",
+    "lead_sections/chess.html": "/wiki/Abstract_strategy_game",
+    "lead_sections/dodge_ram.html": "/wiki/Dodge_Ram",
+    "lead_sections/leaching.html": "/wiki/Leaching_(agriculture)",
+    "lead_sections/list_of_battlestar_galactica_episodes.html": "/wiki/Glen_A._Larson",
+    "lead_sections/mcdonald_s.html": "/wiki/Fast_food",
+    "lead_sections/sony_music.html": "/wiki/Music_industry",
+    # the lead section has only boxes and pictures.
+    "lead_sections/tropical_rainforest_conservation.html": None,
+    "link_cases/brackets_across_tags.html": "/wiki/Literal_translation",
+    # the comment splits the text of the link, so it is not just "or".
+    "link_cases/comment_in_link_text.html": "/wiki/American_and_British_English_spelling_differences",
+    # the brackets in the comment, the script and the style are not a part of the text.
+    "link_cases/comments_and_scripts.html": "/wiki/Language",
+    "link_cases/link_text_with_tags.html": "/wiki/Electromagnetic_spectrum",
+    "link_cases/nested_brackets.html": "/wiki/Language",
+    "link_cases/no_valid_link.html": None,
+    "link_cases/plain.html": "/wiki/Fruit",
+    "link_cases/side_comments.html": "/wiki/Someland",
+    "link_cases/unbalanced_infobox.html": "/wiki/R",
+    "link_cases/unbalanced_paragraph.html": "/wiki/Avon_River",
+}
+# the saved html where the brackets are counted differently than in the original parser on purpose
+# -> the first link both parsers pick now.
+EXPECTED_DIFFERENCES = {
+    # the bracket is opened inside a span and closed after it, so it is outside the parent of the parent of the link.
+    "link_cases/brackets_across_tags.html": "/wiki/Slang",
+    # a bracket left open until the end of a paragraph still encloses the links after it in that paragraph.
+    "link_cases/unbalanced_paragraph.html": "/wiki/Market_town",
+}
+FIRST_LINKS = dict(BASELINE_FIRST_LINKS, **EXPECTED_DIFFERENCES)
+
+
+def saved_files():
+    return sorted(os.path.relpath(file_name, FIXTURES_FOLDER).replace(os.sep, "/")
+                  for folder in FOLDERS for file_name in glob.glob(os.path.join(FIXTURES_FOLDER, folder, "*.html")))
+
+
+def read_saved_file(file_name):
+    with open(os.path.join(FIXTURES_FOLDER, file_name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_every_saved_file_is_pinned():
+    assert saved_files() == sorted(BASELINE_FIRST_LINKS)
+
+
+def test_expected_differences_differ_from_the_baseline():
+    for file_name, first_link in EXPECTED_DIFFERENCES.items():
+        assert BASELINE_FIRST_LINKS[file_name] != first_link
+
+
+@pytest.mark.parametrize("file_name, first_link", sorted(FIRST_LINKS.items()))
+def test_streaming_parser(file_name, first_link):
+    assert FirstLinkExtractor(WikiPage.link_rules).find_first_link(read_saved_file(file_name)) == first_link
+
+
+@pytest.mark.parametrize("file_name, first_link", sorted(FIRST_LINKS.items()))
+def test_streaming_parser_in_small_chunks(monkeypatch, file_name, first_link):
+    # the tags and the brackets are cut between the chunks fed to the parser.
+    monkeypatch.setattr(link_extractor, "CHUNK_SIZE", 7)
+    assert FirstLinkExtractor(WikiPage.link_rules).find_first_link(read_saved_file(file_name)) == first_link
+
+
+@pytest.mark.parametrize("file_name, first_link", sorted(FIRST_LINKS.items()))
+def test_soup_parser(file_name, first_link):
+    assert WikiPage("/wiki/Philosophy").find_first_link_with_soup(read_saved_file(file_name)) == first_link
+
+
+def test_parsers_choose_the_same_link():
+    assert compare_with_soup([os.path.join(FIXTURES_FOLDER, file_name) for file_name in saved_files()]) == []
@@ -0,0 +1,103 @@
+from offline_dump import write_first_links_table, read_dump, first_link_in_wikitext, title_of
+from link_extractor import FirstLinkExtractor
+from link_rules import LinkRules
+import pytest
+import tarfile
+import os
+
+DUMPS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "dumps")
+XML_DUMP = os.path.join(DUMPS_FOLDER, "pages-articles.xml.bz2")
+HTML_DUMP = os.path.join(DUMPS_FOLDER, "html_dump.ndjson")
+
+# the rows of the first links table of each dump: title, first link, revision id, 1 if the page is a redirect.
+XML_DUMP_ROWS = [
+    ["Banana", "Fruit", "1001", "0"],
+    ["Plantain", "Cooking banana", "1002", "1"],
+    # the file, the table, the side-comment, the interwiki and the category links are skipped.
+    ["Word", "Unit of language", "1004", "0"],
+    ["Nothing", "", "1005", "0"],
+]
+HTML_DUMP_ROWS = [
+    ["Banana", "Fruit", "2001", "0"],
+    ["Formula One car", "Formula one", "2006", "0"],
+    ["Nothing", "", "2005", "0"],
+]
+
+
+def read_table(file_name):
+    with open(file_name, encoding="utf-8") as table:
+        return [line.rstrip("\n").split("\t") for line in table]
+
+
+@pytest.mark.parametrize("dump_file_name, rows", [(XML_DUMP, XML_DUMP_ROWS), (HTML_DUMP, HTML_DUMP_ROWS)])
+def test_write_first_links_table(tmp_path, dump_file_name, rows):
+    table_file_name = str(tmp_path / "first_links.tsv")
+    assert write_first_links_table(dump_file_name, table_file_name, processes=1) == len(rows)
+    assert read_table(table_file_name) == rows
+
+
+def test_html_dump_in_a_tar(tmp_path):
+    tar_file_name = str(tmp_path / "enwiki-NS0-ENTERPRISE-HTML.json.tar.gz")
+    with tarfile.open(tar_file_name, "w:gz") as tar:
+        tar.add(HTML_DUMP, arcname="enwiki_0.ndjson")
+    table_file_name = str(tmp_path / "first_links.tsv")
+    write_first_links_table(tar_file_name, table_file_name, processes=1)
+    assert read_table(table_file_name) == HTML_DUMP_ROWS
+
+
+def test_only_articles_are_read():
+    assert [page.title for page in read_dump(XML_DUMP)] == [row[0] for row in XML_DUMP_ROWS]
+    assert [page.title for page in read_dump(HTML_DUMP)] == [row[0] for row in HTML_DUMP_ROWS]
+
+
+# wikitext -> the same lead section in the html rendered from it.
+SAME_FIRST_LINK = [
+    ("'''Banana''' ([[Wolof language|Wolof]]) is an ''[[edible]]'' [[fruit]].",
+     '<p><b>Banana</b> (<a href="/wiki/Wolof_language">Wolof</a>) is an <i><a href="/wiki/Edible">edible</a></i> '
+     '<a href="/wiki/Fruit">fruit</a>.</p>'),
+    # a bracket left open in a paragraph doesn't enclose the links of the next one, or of a list.
+    ("This is about the town (for the river, see [[Avon River]].\n\n'''Avon''' is a [[market town]].",
+     '<p>This is about the town (for the river, see <a href="/wiki/Avon_River">Avon River</a>.</p>\n'
+     '<p><b>Avon</b> is a <a href="/wiki/Market_town">market town</a>.</p>'),
+    ("'''Avon''' may refer to (a list:\n* [[Market town]]",
+     '<p><b>Avon</b> may refer to (a list:</p>\n<ul><li><a href="/wiki/Market_town">Market town</a></li></ul>'),
+    # a link in bold text inside italic text is rendered in a <b>, so it isn't a side-comment.
+    ("'''''[[Bold]]''''' is a [[word]].",
+     '<p><i><b><a href="/wiki/Bold">Bold</a></b></i> is a <a href="/wiki/Word">word</a>.</p>'),
+    ("''Some '''[[Bold]]''' text'' is a [[word]].",
+     '<p><i>Some <b><a href="/wiki/Bold">Bold</a></b> text</i> is a <a href="/wiki/Word">word</a>.</p>'),
+    ("'''''[[Italic]]''' text'' is a [[word]].",
+     '<p><i><b><a href="/wiki/Italic">Italic</a></b> text</i> is a <a href="/wiki/Word">word</a>.</p>'),
+    ("Colour [[American and British English spelling differences|or]] color is a [[perception]].",
+     '<p>Colour <a href="/wiki/American_and_British_English_spelling_differences">or</a> color is a '
+     '<a href="/wiki/Perception">perception</a>.</p>'),
+]
+# the documented differences from the online crawl (see first_link_in_wikitext()):
+# (wikitext, the html rendered from it, the first link offline, the first link online).
+DIFFERENT_FIRST_LINK = [
+    # a link rendered by a template.
+    ("{{lang|fr|[[Mot]]}} is a [[word]].",
+     '<p><span lang="fr"><a href="/wiki/Mot">Mot</a></span> is a <a href="/wiki/Word">word</a>.</p>',
+     "Word", "Mot"),
+    # a link in a table which isn't a box.
+    ('{| class="wikitable"\n| [[Cell]]\n|}\nA [[word]].',
+     '<table class="wikitable"><tr><td><a href="/wiki/Cell">Cell</a></td></tr></table>\n'
+     '<p>A <a href="/wiki/Word">word</a>.</p>',
+     "Word", "Cell"),
+]
+
+
+def online_first_link(html):
+    first_link = FirstLinkExtractor(LinkRules()).find_first_link(html)
+    return None if first_link is None else title_of(first_link.replace("/wiki/", "", 1))
+
+
+@pytest.mark.parametrize("wikitext, html", SAME_FIRST_LINK)
+def test_wikitext_first_link_is_the_online_one(wikitext, html):
+    assert first_link_in_wikitext(wikitext, LinkRules()) == online_first_link(html)
+
+
+@pytest.mark.parametrize("wikitext, html, offline, online", DIFFERENT_FIRST_LINK)
+def test_wikitext_first_link_documented_differences(wikitext, html, offline, online):
+    assert first_link_in_wikitext(wikitext, LinkRules()) == offline
+    assert online_first_link(html) == online
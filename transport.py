@@ -0,0 +1,154 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import METRICS
+
+# Wikimedia asks clients to identify themselves: https://meta.wikimedia.org/wiki/User-Agent_policy
+USER_AGENT = "wikiGraph (https://github.com/Tom-stack3/wikiGraph) python-requests/" + requests.__version__
+
+# seconds to wait for the server before giving up on a request.
+DEFAULT_TIMEOUT = 30
+# how many times a failed request is sent again.
+DEFAULT_MAX_RETRIES = 5
+# the first retry waits BACKOFF_FACTOR seconds, and every retry after it waits twice as long.
+BACKOFF_FACTOR = 0.5
+# the longest we agree to wait before a retry, even if the server asks for more.
+MAX_BACKOFF = 60
+# the status codes worth sending the request again for.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# don't let our requests load the servers when the database replicas are lagging.
+# https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
+MAX_LAG = 5
+
+# the default rate limit: requests per second, and how many requests can be sent at once after being idle.
+DEFAULT_REQUESTS_PER_SECOND = 10
+DEFAULT_BURST = 20
+
+# the number of connections kept alive for reuse.
+DEFAULT_POOL_SIZE = 16
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter. Each request takes a token, and the tokens fill up at a constant rate.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: the number of tokens added each second.
+        :param capacity: the maximum number of tokens the bucket holds.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_fill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Takes a token, waits until one is available if the bucket is empty.
+
+        :return: None
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_fill) * self.rate)
+                self.last_fill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class WikiSession:
+    """
+    The HTTP transport used to talk to Wikipedia.
+    It keeps the connections alive for reuse, asks for gzipped responses, retries failed requests with an
+    exponential backoff (honouring Retry-After and the MediaWiki maxlag parameter) and limits the request rate.
+    """
+
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST,
+                 max_retries=DEFAULT_MAX_RETRIES, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+        """
+        :param requests_per_second: the maximum rate of requests. None - no rate limit.
+        :param burst: how many requests can be sent at once after being idle.
+        :param max_retries: how many times a failed request is sent again.
+        :param timeout: seconds to wait for the server before giving up on a request.
+        :param pool_size: the number of connections kept alive for reuse.
+        """
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.rate_limiter = None if requests_per_second is None else TokenBucket(requests_per_second, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"})
+
+    def get(self, url, params=None):
+        """
+        Sends a GET request, and retries it if it failed with a transient error.
+
+        :param url: the url to get.
+        :param params: additional query parameters.
+        :return: the requests.Response got. If all the retries failed, the last response got.
+        """
+        params = dict(params or {})
+        if "api.php" in url:
+            params.setdefault("maxlag", MAX_LAG)
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.take()
+            if attempt > 0:
+                METRICS.count("retries")
+            METRICS.count("requests")
+            try:
+                with METRICS.stage("fetch"):
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                METRICS.count("request_errors")
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(WikiSession.backoff(attempt))
+                continue
+            METRICS.count("response_bytes", len(response.content))
+
+            delay = WikiSession.retry_delay(response, attempt)
+            if delay is None or attempt == self.max_retries:
+                return response
+            time.sleep(delay)
+
+    @staticmethod
+    def retry_delay(response, attempt):
+        """
+        Decides if a request should be sent again, and how long to wait before it.
+
+        :param response: the requests.Response got.
+        :param attempt: the number of retries done so far.
+        :return: the seconds to wait before sending the request again, or None if no retry is needed.
+        """
+        lagged = response.headers.get("MediaWiki-API-Error") == "maxlag"
+        if response.status_code not in RETRY_STATUS_CODES and not lagged:
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            return min(int(retry_after), MAX_BACKOFF)
+        return WikiSession.backoff(attempt)
+
+    @staticmethod
+    def backoff(attempt):
+        """
+        The exponential backoff before a retry, with some jitter so parallel requests don't retry together.
+
+        :param attempt: the number of retries done so far.
+        :return: the seconds to wait.
+        """
+        return min(BACKOFF_FACTOR * (2 ** attempt), MAX_BACKOFF) * random.uniform(0.5, 1)
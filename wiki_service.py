@@ -0,0 +1,300 @@
+import helper
+import refresh
+from WikiPage import WikiPage
+from chain_memo import ChainMemo, PHILOSOPHY
+from metrics import METRICS
+# to answer many requests at the same time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import Future
+import threading
+import json
+import time
+import sys
+
+# the service only listens locally by default.
+HOST = "127.0.0.1"
+PORT = 8080
+# the formats rendered when a request doesn't ask for any.
+DEFAULT_RENDER_FORMATS = ["svg"]
+# the maximum number of titles drawn in a single request.
+MAX_TITLES_PER_RENDER = 500
+
+
+class ChainService:
+    """
+    Keeps the first links of every page known warm in memory, and answers chain queries from many threads.
+
+    A page is fetched only the first time any request reaches it. Requests reaching a page another request is
+    fetching right now wait for it instead of fetching it again, so identical lookups are coalesced.
+    """
+
+    def __init__(self, memo=None, debug=False):
+        """
+        :param memo: the ChainMemo of the pages known. None - the module's helper.CHAIN_MEMO.
+        :type memo: ChainMemo
+        :param debug: True - if you want to debug or get information about the program while it's running.
+                False - default
+        :type debug: bool
+        """
+        self.memo = helper.CHAIN_MEMO if memo is None else memo
+        self.debug = debug
+        # guards the memo: the pages are fetched outside of it, only recording them is done inside.
+        self.lock = threading.Lock()
+        # graphs are drawn and rendered one at a time.
+        self.drawing_lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        # page name -> the Future of the page being fetched right now.
+        self.in_flight = {}
+        self.started_at = time.time()
+
+    def warm(self, cache):
+        """
+        Loads every page in the link cache into the memo, so the pages visited in any previous run are answered
+        without touching the disk or the network.
+
+        :param cache: the LinkCache to load.
+        :type cache: LinkCache
+        :return: the number of pages loaded.
+        """
+        entries = cache.entries()
+        with self.lock:
+            for title, cached in entries:
+                next_name = None if cached.first_link is None else WikiPage(cached.first_link).name
+                self.memo.set_successor(title, next_name)
+                # if the page was a redirect, it is known by the name it redirects to as well.
+                if cached.name != title:
+                    self.memo.set_successor(cached.name, next_name)
+        return len(entries)
+
+    def next_page(self, page):
+        """
+        Gets the next page in the chain of page. The page is fetched only if no request reached it before,
+        and no other request is fetching it right now.
+
+        :param page: the WikiPage page.
+        :type page: WikiPage page
+        :return: the next WikiPage in the chain, or None if the page has no valid link.
+        """
+        name = page.name
+        with self.lock:
+            if name in self.memo:
+                METRICS.count("memo_hits")
+                return self.memo.successor_page(name, self.debug)
+            future = self.in_flight.get(name)
+            fetching = future is None
+            if fetching:
+                future = self.in_flight[name] = Future()
+
+        if not fetching:
+            METRICS.count("coalesced_lookups")
+            future.result()
+            with self.lock:
+                return self.memo.successor_page(name, self.debug)
+
+        try:
+            next_page = ChainMemo.fetch_next_page(page, self.debug)
+        except Exception as e:
+            with self.lock:
+                del self.in_flight[name]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.memo.record_visit(name, page, next_page)
+            del self.in_flight[name]
+        future.set_result(None)
+        return next_page
+
+    def path(self, title):
+        """
+        Walks the chain of a page, until reaching "Philosophy", a loop or a dead end.
+
+        :param title: the name of the page.
+        :return: a dict of the names of the pages in the chain (in order) and where it ends, ready to be sent as json.
+        """
+        page = WikiPage.from_name(title, self.debug)
+        # if every page in the chain is known, it is walked right away from the memo, without waiting on any fetch.
+        with self.lock:
+            if self.memo.resolve(page.name) is not None:
+                METRICS.count("resolved_paths")
+                return self.walk(title, page, lambda p: self.memo.successor_page(p.name, self.debug))
+        return self.walk(title, page, self.next_page)
+
+    @staticmethod
+    def walk(title, page, next_page):
+        """
+        :param title: the name of the page, as requested.
+        :param page: the WikiPage page.
+        :type page: WikiPage page
+        :param next_page: a function getting the next WikiPage in the chain of a page (None - no valid link).
+        :return: the dict returned by path().
+        """
+        road_of_page = [page.name]
+        result = {"title": title, "path": road_of_page, "end": "too long"}
+        while len(road_of_page) <= 101:
+            if page.name == PHILOSOPHY:
+                result["end"] = PHILOSOPHY
+                break
+            page = next_page(page)
+            if page is None:
+                result["end"] = "dead end"
+                break
+            if page.name in road_of_page:
+                result["end"] = "loop"
+                result["loop"] = road_of_page[road_of_page.index(page.name):]
+                road_of_page.append(page.name)
+                break
+            road_of_page.append(page.name)
+        result["clicks"] = len(road_of_page) - 1
+        return result
+
+    def render(self, titles, file_formats=None):
+        """
+        Draws the chains of the pages into a single graph, and renders it into the /output folder.
+
+        :param titles: the names of the first pages.
+        :param file_formats: the file formats of the output. None - DEFAULT_RENDER_FORMATS.
+        :return: a dict of the number of pages drawn and the files rendered, ready to be sent as json.
+        """
+        start_time = time.time()
+        # the chains are walked first (concurrently with other requests), and drawn from the pages walked: a page
+        # refreshed in between isn't in the memo anymore, and fetching it again would hold the lock over the network.
+        walked = {}
+        for title in titles:
+            road_of_page = self.path(title)["path"]
+            walked.update(zip(road_of_page, road_of_page[1:]))
+
+        def walked_next_page(page):
+            next_name = walked.get(page.name)
+            return None if next_name is None else WikiPage.from_name(next_name, self.debug)
+
+        with self.drawing_lock:
+            u = helper.create_digraph()
+            pages_drawn = set()
+            with self.lock:
+                for title in titles:
+                    helper.draw_page_path(WikiPage.from_name(title, self.debug), u, pages_drawn, self.debug, self.memo,
+                                          walked_next_page)
+            u = helper.summarize_large_graph(u, titles, len(pages_drawn), memo=self.memo)
+            time_in_minutes = "{:.2f}".format((time.time() - start_time) / 60)
+            u.attr(label=helper.create_label_for_output_file(titles, time_in_minutes, len(pages_drawn)),
+                   fontsize=helper.LABEL_FONT_SIZE)
+            files = helper.render_graph(u, titles, file_formats or DEFAULT_RENDER_FORMATS)
+        return {"titles": titles, "pages_drawn": len(pages_drawn), "files": files}
+
+    def refresh(self):
+        """
+        Computes again the first links of the cached pages which were edited, and forgets the chains passing through
+        them, so the next requests reaching them follow the new first links.
+
+        :return: a dict of the names of the pages which changed, ready to be sent as json.
+        """
+        if WikiPage.cache is None:
+            return {"changed": []}
+        # a single refresh at a time, as two of them would fetch the same pages.
+        with self.refresh_lock:
+            changed = refresh.refresh_cache(WikiPage.cache, self.memo, self.debug, self.lock)
+        METRICS.count("pages_refreshed", len(changed))
+        return {"changed": changed}
+
+    def stats(self):
+        """
+        :return: a dict of the state of the service and the metrics of the run, ready to be sent as json.
+        """
+        with self.lock:
+            stats = {"uptime_seconds": round(time.time() - self.started_at, 1),
+                     "pages_known": len(self.memo),
+                     "in_flight": len(self.in_flight)}
+        stats["cache_entries"] = None if WikiPage.cache is None else len(WikiPage.cache)
+        stats["metrics"] = METRICS.to_json()
+        return stats
+
+
+class ChainServer(ThreadingHTTPServer):
+    """
+    The HTTP/JSON API of a ChainService:
+        GET /path?title=Banana
+        GET /render?titles=Banana|Mathematics&format=svg&format=pdf
+        GET /refresh (computes again the first links of the pages edited since they were cached)
+        GET /stats
+        GET /metrics (the metrics in the Prometheus text format)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service, host=HOST, port=PORT):
+        """
+        :param service: the ChainService answering the requests.
+        :type service: ChainService
+        :param host: the address to listen on.
+        :param port: the port to listen on. 0 - any free port.
+        """
+        super().__init__((host, port), ChainHandler)
+        self.service = service
+
+
+class ChainHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        service = self.server.service
+        endpoint = url.path.strip("/")
+        METRICS.count("service_requests")
+        try:
+            with METRICS.stage("serve_" + (endpoint or "root")):
+                if endpoint == "path" and "title" in query:
+                    self.send_json(200, service.path(query["title"][0]))
+                elif endpoint == "render" and "titles" in query:
+                    titles = [t.strip() for t in "|".join(query["titles"]).split("|") if t.strip()]
+                    if len(titles) > MAX_TITLES_PER_RENDER:
+                        self.send_json(400, {"error": "at most " + str(MAX_TITLES_PER_RENDER) + " titles"})
+                    else:
+                        self.send_json(200, service.render(titles, query.get("format")))
+                elif endpoint == "refresh":
+                    self.send_json(200, service.refresh())
+                elif endpoint == "stats":
+                    self.send_json(200, service.stats())
+                elif endpoint == "metrics":
+                    self.send_body(200, METRICS.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+                elif endpoint in ("path", "render"):
+                    self.send_json(400, {"error": "missing the " + ("title" if endpoint == "path" else "titles") +
+                                                  " parameter"})
+                else:
+                    self.send_json(404, {"error": "unknown endpoint: " + url.path})
+        except Exception as e:
+            METRICS.count("service_errors")
+            self.send_json(502, {"error": str(e)})
+
+    def send_json(self, status, content):
+        self.send_body(status, json.dumps(content).encode("utf-8"), "application/json; charset=utf-8")
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # the requests are counted in the metrics, we don't print every one of them.
+        pass
+
+
+if __name__ == '__main__':
+    # to start the service (the pages in first_links.sqlite are loaded first):
+    #     python wiki_service.py [port]
+    # then, e.g:
+    #     curl "http://127.0.0.1:8080/path?title=Banana"
+    chain_service = ChainService()
+    print("loaded", chain_service.warm(helper.enable_link_cache()), "pages from the cache")
+    metrics_reporter = helper.start_metrics_reporter()
+    server = ChainServer(chain_service, port=int(sys.argv[1]) if len(sys.argv) > 1 else PORT)
+    print("listening on http://" + HOST + ":" + str(server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        metrics_reporter.stop()